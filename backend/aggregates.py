@@ -0,0 +1,215 @@
+import datetime
+import json
+import os
+
+import pandas as pd
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import CompanyAggregate
+from crypto_utils import encrypt_value, decrypt_value
+from ledger import Ledger, prepare_ledger
+from bookkeeping import classify_transactions
+from money import cents, frame_cents, split_totals
+from persistence import company_key, company_ids, get_or_create_company_id
+
+RECENT_TRANSACTIONS = 20  # Same window as auto_categorize
+# Attempts at an append that keeps losing the compare-and-swap to concurrent appends
+AGGREGATE_APPEND_ATTEMPTS = int(os.getenv("AGGREGATE_APPEND_ATTEMPTS", "5"))
+
+class RunningAggregates:
+    """
+    A company's metrics maintained across appended transaction batches:
+    revenue/expense totals, expense totals per category, monthly revenue and
+    expense buckets (with row counts, like ledger.monthly_aggregate) and the
+    newest transactions. update() only touches the new rows; ledger() and
+    bookkeeping() rebuild the shapes the forecast, tax and working capital
+    stages read, at a cost that depends on months/categories, not rows.
+    Money is kept in int cents, so the totals after any sequence of batches
+    are exact and don't depend on how the rows were split or ordered.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        if state and "revenue_cents" not in state:
+            state = self._cents_state(state)
+        self.revenue_cents = state.get("revenue_cents", 0)
+        self.expense_cents = state.get("expense_cents", 0)
+        self.transactions = state.get("transactions", 0)
+        self.categories = state.get("categories", {})  # expense category -> abs total in cents
+        self.months = state.get("months", {})          # "YYYY-MM" -> [revenue, expenses (cents), revenue_rows, expense_rows]
+        self.recent = state.get("recent", [])          # newest first, auto_categorize's recent_transactions format
+        self.dated = state.get("dated", bool(self.months))  # Some batch had a date column (even if none parsed)
+        self._classified = {}                          # classify_transactions memo across update() calls (not stored)
+
+    @staticmethod
+    def _cents_state(state):
+        """
+        A state stored before amounts were kept in cents (float units) -> cents.
+        """
+        return {
+            **state,
+            "revenue_cents": cents(state.get("total_revenue", 0)),
+            "expense_cents": cents(state.get("total_expenses", 0)),
+            "categories": {name: cents(value) for name, value in state.get("categories", {}).items()},
+            "months": {key: [cents(revenue), cents(expenses), revenue_rows, expense_rows]
+                       for key, (revenue, expenses, revenue_rows, expense_rows) in state.get("months", {}).items()},
+        }
+
+    def update(self, df, batch_is_newer=True):
+        """
+        Folds one batch of new transactions into the aggregates.
+        batch_is_newer=False is for consecutive chunks of a single upload: rows
+        sharing a date with earlier chunks then rank after them in recent, in
+        upload order, as auto_categorize ranks them over the whole file.
+        """
+        df = df.copy()
+        df.columns = df.columns.str.lower().str.strip()
+        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0)
+        df['amount_cents'] = frame_cents(df)
+        amount_cents = df['amount_cents']
+
+        batch = split_totals(amount_cents)
+        self.revenue_cents += batch["revenue_cents"]
+        self.expense_cents += batch["expense_cents"]
+        self.transactions += len(df)
+
+        if 'description' in df.columns:
+            df['category'] = classify_transactions(df['description'], df['amount'], self._classified)
+            expenses = df[amount_cents < 0]
+            for name, value in (-expenses['amount_cents']).groupby(expenses['category'], observed=True).sum().items():
+                self.categories[name] = self.categories.get(name, 0) + int(value)
+
+        ledger = prepare_ledger(df)
+        if ledger.monthly is not None:
+            self.dated = True
+            for month_end, row in zip(ledger.monthly.index, ledger.monthly.itertuples(index=False)):
+                if row.revenue_rows == 0 and row.expense_rows == 0:
+                    continue
+                bucket = self.months.setdefault(month_end.strftime("%Y-%m"), [0, 0, 0, 0])
+                bucket[0] += int(row.revenue_cents)
+                bucket[1] += int(row.expense_cents)
+                bucket[2] += int(row.revenue_rows)
+                bucket[3] += int(row.expense_rows)
+
+            if 'description' in df.columns:
+                dated = ledger.newest(RECENT_TRANSACTIONS)
+                newest = [
+                    {"date": d.strftime('%Y-%m-%d'), "description": desc, "amount": float(amount), "category": category}
+                    for d, desc, amount, category in zip(dated['date'], dated['description'], dated['amount'], dated['category'])
+                ]
+                # Stable sort: on equal dates, whichever list comes first stays ahead
+                merged = newest + self.recent if batch_is_newer else self.recent + newest
+                self.recent = sorted(merged, key=lambda t: t["date"], reverse=True)[:RECENT_TRANSACTIONS]
+        elif 'description' in df.columns and len(self.recent) < RECENT_TRANSACTIONS:
+            # Undated ledgers: the first rows, like auto_categorize's fallback
+            head = df.head(RECENT_TRANSACTIONS - len(self.recent))
+            self.recent += [
+                {"description": desc, "amount": float(amount), "category": category, "date": "N/A"}
+                for desc, amount, category in zip(head['description'], head['amount'], head['category'])
+            ]
+
+    def totals(self):
+        return {"revenue_cents": self.revenue_cents, "expense_cents": self.expense_cents}
+
+    def ledger(self):
+        """
+        A Ledger whose monthly aggregate comes from the buckets (gap months as 0),
+        enough for generate_forecast and analyze_working_capital. Like
+        prepare_ledger, monthly is None only without a date column; dates that
+        never parsed give an empty aggregate.
+        """
+        columns = ['revenue_cents', 'expense_cents', 'revenue_rows', 'expense_rows']
+        if not self.months:
+            if not self.dated:
+                return Ledger(None, None)
+            empty = pd.DataFrame({column: pd.Series(dtype='int64') for column in columns},
+                                 index=pd.DatetimeIndex([], name='date'))
+            return Ledger(None, empty)
+        periods = pd.PeriodIndex(sorted(self.months), freq='M')
+        monthly = pd.DataFrame(
+            [self.months[key] for key in sorted(self.months)],
+            index=periods, columns=columns
+        )
+        monthly = monthly.reindex(pd.period_range(periods.min(), periods.max(), freq='M'), fill_value=0)
+        monthly.index = monthly.index.to_timestamp(how='end').normalize()
+        monthly.index.name = 'date'
+        return Ledger(None, monthly)
+
+    def bookkeeping(self):
+        """
+        The auto_categorize result shape (breakdown in cents + recent transactions).
+        """
+        if not self.categories and not self.recent:
+            return None
+        return {
+            "breakdown": [{"name": name, "value_cents": self.categories[name]} for name in sorted(self.categories)],
+            "recent_transactions": self.recent
+        }
+
+    def to_dict(self):
+        return {
+            "revenue_cents": self.revenue_cents,
+            "expense_cents": self.expense_cents,
+            "transactions": self.transactions,
+            "categories": self.categories,
+            "months": self.months,
+            "recent": self.recent,
+            "dated": self.dated,
+        }
+
+def _load(db, company_id):
+    """
+    (state, version) of the company's stored aggregates, or None.
+    """
+    stmt = select(CompanyAggregate.state, CompanyAggregate.version).where(CompanyAggregate.company_id == company_id)
+    return db.execute(stmt).first()
+
+def append_transactions(db, company_name, industry, df, reset=False):
+    """
+    Adds a batch of new transactions to the company's stored aggregates and
+    returns the updated RunningAggregates. reset=True starts over from this
+    batch, e.g. when a full ledger is uploaded as the new baseline.
+    The write is a compare-and-swap on the row's version (row locks do nothing
+    on SQLite): when another append committed in between, the batch is folded
+    again into the newer state, up to AGGREGATE_APPEND_ATTEMPTS times.
+    """
+    key = company_key(company_name, industry)
+    for attempt in range(AGGREGATE_APPEND_ATTEMPTS):
+        try:
+            company_id = company_ids.get(key) or get_or_create_company_id(db, company_name, industry, key)
+            row = _load(db, company_id)
+            state = None
+            if row is not None and not reset:
+                state = json.loads(decrypt_value(row.state) or "{}")
+            aggregates = RunningAggregates(state)
+            aggregates.update(df)
+
+            values = {
+                "state": encrypt_value(json.dumps(aggregates.to_dict())),
+                "transactions": aggregates.transactions,
+                "updated_at": datetime.datetime.utcnow(),
+            }
+            if row is None:
+                db.add(CompanyAggregate(company_id=company_id, version=1, **values))
+                db.flush()
+            else:
+                stmt = (
+                    update(CompanyAggregate)
+                    .where(CompanyAggregate.company_id == company_id, CompanyAggregate.version == row.version)
+                    .values(version=row.version + 1, **values)
+                )
+                if db.execute(stmt).rowcount != 1:
+                    # Another append won the race; start again from its state
+                    db.rollback()
+                    continue
+            db.commit()
+            company_ids.put(key, company_id)
+            return aggregates
+        except IntegrityError:
+            # Another request created this company's (or its aggregate) row first; retry against it
+            db.rollback()
+        except Exception:
+            db.rollback()
+            raise
+    raise RuntimeError(f"Could not append transactions for {company_name}: {AGGREGATE_APPEND_ATTEMPTS} concurrent updates in a row")
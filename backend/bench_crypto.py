@@ -0,0 +1,50 @@
+"""
+Benchmark for decrypting FinancialReport fields: 100k rows x (revenue, expenses,
+net_profit), per-value decrypt_value calls vs decrypt_columns, inline and on a
+thread pool. Uses a throwaway key, so secret.key is never touched.
+
+Usage: python bench_crypto.py [rows] [workers]
+"""
+import os
+import sys
+import time
+
+from cryptography.fernet import Fernet
+
+os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+import pandas as pd
+
+from crypto_utils import encrypt_values, decrypt_value, decrypt_columns
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+FIELDS = ["revenue", "expenses", "net_profit"]
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed:7.2f}s  {ROWS / elapsed:10.0f} rows/s")
+    return result
+
+def main():
+    start = time.perf_counter()
+    frame = pd.DataFrame({
+        field: encrypt_values([round(1000 + i * 1.5 + offset, 2) for i in range(ROWS)])
+        for offset, field in enumerate(FIELDS)
+    })
+    print(f"Encrypted {ROWS} rows x {len(FIELDS)} fields in {time.perf_counter() - start:.2f}s")
+    print(f"Decrypting {ROWS} rows ({os.cpu_count()} CPUs)")
+
+    legacy = timed("per-value decrypt_value", lambda: pd.DataFrame({
+        field: [decrypt_value(token, float) for token in frame[field]] for field in FIELDS
+    }))
+    inline = timed("decrypt_columns", lambda: decrypt_columns(frame, FIELDS, float, workers=1))
+    pooled = timed(f"decrypt_columns ({WORKERS} threads)", lambda: decrypt_columns(frame, FIELDS, float, workers=WORKERS))
+
+    assert legacy.equals(inline[FIELDS]) and legacy.equals(pooled[FIELDS]), "decrypted values differ"
+    print("  results identical")
+
+if __name__ == "__main__":
+    main()
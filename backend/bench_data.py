@@ -0,0 +1,112 @@
+"""
+Deterministic synthetic inputs for the benchmarks: CSV ledgers, multi-page PDF
+statements and GSTR-1 JSON at any size. The same (size, seed) always gives the
+same transactions, so timings are comparable across runs and machines.
+"""
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+
+from bookkeeping import CATEGORIES
+
+START_DATE = pd.Timestamp("2023-01-01")
+PAYEES = ["Client Payment", "Transfer", "ACME Corp", "POS Purchase", "Refund", "Card Settlement"]
+
+def make_ledger(rows, seed=0, months=24):
+    """
+    DataFrame of date / description / amount. About 35% of rows are revenue; the
+    rest are expenses whose descriptions mix category keywords with other payees.
+    Amounts follow a slow trend plus yearly seasonality.
+    """
+    rng = np.random.default_rng(seed)
+    keywords = np.array([kw for kws in CATEGORIES.values() for kw in kws] + PAYEES, dtype=object)
+    day = np.sort(rng.integers(0, months * 30, rows))
+    dates = START_DATE + pd.to_timedelta(day, unit="D")
+
+    revenue = rng.random(rows) < 0.35
+    level = 1000 * (1.01 ** (day / 30)) * (1 + 0.2 * np.sin(2 * np.pi * day / 365))
+    amount = np.round(level * rng.lognormal(0, 0.5, rows) * np.where(revenue, 1.0, -0.6), 2)
+
+    payee = rng.choice(keywords, rows)
+    ref = rng.integers(1000, 9999, rows)
+    description = np.where(
+        revenue,
+        np.char.add("Client Payment INV", ref.astype(str)),
+        np.char.add(np.char.add(np.char.title(payee.astype(str)), " REF"), ref.astype(str))
+    )
+    return pd.DataFrame({"date": dates, "description": description.astype(object), "amount": amount})
+
+def csv_ledger(rows, seed=0):
+    """
+    The ledger as CSV bytes with the usual bank export headers.
+    """
+    df = make_ledger(rows, seed)
+    out = io.StringIO()
+    df.rename(columns={"date": "Date", "description": "Description", "amount": "Amount"}).to_csv(
+        out, index=False, date_format="%Y-%m-%d"
+    )
+    return out.getvalue().encode("utf-8")
+
+def pdf_statement(pages, rows_per_page=40, seed=0):
+    """
+    A text PDF bank statement, one transaction per line (date, description,
+    amount), in the layout parse_pdf's line regex reads.
+    """
+    df = make_ledger(pages * rows_per_page, seed)
+    pdf = FPDF()
+    pdf.set_font("Courier", size=8)
+    for start in range(0, len(df), rows_per_page):
+        pdf.add_page()
+        pdf.cell(0, 6, f"Statement page {start // rows_per_page + 1}", 0, 1)
+        for row in df.iloc[start:start + rows_per_page].itertuples(index=False):
+            line = f"{row.date:%Y-%m-%d}  {row.description:<40}  {row.amount:,.2f}"
+            pdf.cell(0, 5, line, 0, 1)
+    return pdf.output(dest="S").encode("latin-1")
+
+def gstr1_json(invoices, seed=0, b2cs_entries=12):
+    """
+    GSTR-1 return JSON bytes: invoices spread over 20 customers in the b2b
+    section plus monthly b2cs totals.
+    """
+    rng = np.random.default_rng(seed)
+    day = np.sort(rng.integers(0, 365, invoices))
+    dates = (START_DATE + pd.to_timedelta(day, unit="D")).strftime("%d-%m-%Y")
+    values = np.round(rng.lognormal(8, 0.8, invoices), 2)
+    customers = rng.integers(0, 20, invoices)
+
+    b2b = []
+    for customer in range(20):
+        idx = np.flatnonzero(customers == customer)
+        b2b.append({
+            "ctin": f"29ABCDE{customer:04d}F1Z5",
+            "inv": [{"inum": f"INV{i:06d}", "idt": dates[i], "val": float(values[i])} for i in idx]
+        })
+    b2cs = [{"sply_ty": "INTRA", "txval": float(v)} for v in np.round(rng.lognormal(10, 0.3, b2cs_entries), 2)]
+    return json.dumps({"gstin": "29ABCDE1234F1Z5", "fp": "122023", "b2b": b2b, "b2cs": b2cs}).encode("utf-8")
+
+def report_result(seed=0):
+    """
+    An /analyze-shaped result for generate_pdf_report.
+    """
+    rng = np.random.default_rng(seed)
+    revenue = float(np.round(rng.uniform(1e5, 1e6), 2))
+    expenses = float(np.round(revenue * rng.uniform(0.5, 0.95), 2))
+    profit = revenue - expenses
+    return {
+        "health_score": int(50 + 100 * profit / revenue),
+        "metrics": {
+            "Total Revenue": revenue,
+            "Total Expenses": expenses,
+            "Net Profit": profit,
+            "Profit Margin": f"{100 * profit / revenue:.2f}%",
+        },
+        "ai_analysis": json.dumps({
+            "executive_summary": "Revenue grew steadily over the period while operating costs stayed within budget. "
+                                 "Working capital is adequate and the business can service additional credit.",
+            "creditworthiness": "Medium",
+        }),
+        "tax": {"estimated_tax": profit * 0.25, "message": "Tax liability is manageable."},
+    }
@@ -0,0 +1,62 @@
+"""
+Benchmark for portfolio forecasting: one generate_forecast call per company
+(the per-upload path) vs forecast_batch over the whole long-format frame.
+Synthetic portfolio: 1k companies x 36 months of transactions by default.
+
+Usage: python bench_forecast_batch.py [companies] [months] [transactions_per_month]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from forecasting import generate_forecast, forecast_batch
+
+COMPANIES = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+MONTHS = int(sys.argv[2]) if len(sys.argv) > 2 else 36
+PER_MONTH = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+def make_portfolio(seed=0):
+    """
+    Each company: trend + yearly seasonality + noise, PER_MONTH transactions
+    a month (about a third of them expenses), ending in the same month.
+    """
+    rng = np.random.default_rng(seed)
+    rows = COMPANIES * MONTHS * PER_MONTH
+    company = np.repeat(np.arange(COMPANIES), MONTHS * PER_MONTH)
+    month = np.tile(np.repeat(np.arange(MONTHS), PER_MONTH), COMPANIES)
+    base = rng.uniform(500, 5000, COMPANIES)[company]
+    growth = rng.normal(0.01, 0.01, COMPANIES)[company]
+    season = 1 + 0.2 * np.sin(2 * np.pi * month / 12)
+    amount = base * (1 + growth) ** month * season * rng.lognormal(0, 0.3, rows)
+    amount = np.where(rng.random(rows) < 0.35, -0.8 * amount, amount).round(2)
+    start = pd.Timestamp("2022-01-01")
+    dates = start + pd.to_timedelta(month * 30 + rng.integers(0, 28, rows), unit="D")
+    return pd.DataFrame({"company_id": company, "date": dates, "amount": amount})
+
+def main():
+    portfolio = make_portfolio()
+    print(f"{COMPANIES} companies x {MONTHS} months, {len(portfolio)} transactions")
+
+    start = time.perf_counter()
+    looped = {
+        company_id: generate_forecast(group[["date", "amount"]])
+        for company_id, group in portfolio.groupby("company_id", sort=False)
+    }
+    loop_s = time.perf_counter() - start
+    print(f"  generate_forecast per company  {loop_s:7.2f}s  ({loop_s / COMPANIES * 1000:.2f} ms/company)")
+
+    start = time.perf_counter()
+    batched = forecast_batch(portfolio)
+    batch_s = time.perf_counter() - start
+    print(f"  forecast_batch                 {batch_s:7.2f}s  ({batch_s / COMPANIES * 1000:.2f} ms/company)  {loop_s / batch_s:.1f}x")
+
+    for entry in batched:
+        single = looped[entry["company_id"]]
+        for key in ("revenue_forecast", "expense_forecast", "models"):
+            assert single[key] == entry[key], f"company {entry['company_id']}: {key} differs"
+    print("  results identical")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Load benchmark for the /analyze endpoint against a local stub LLM server.
+
+The stub answers every chat completion after a fixed delay, so N concurrent
+uploads should finish in roughly one LLM latency (not N of them) as long as
+N <= LLM_MAX_CONCURRENCY.
+
+Usage: python bench_llm_concurrency.py [concurrency] [llm_delay_seconds]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+LLM_DELAY = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+STUB_ANALYSIS = {
+    "creditworthiness": "High",
+    "risk_assessment": "Stub risk assessment.",
+    "cost_optimization": ["Stub strategy 1", "Stub strategy 2"],
+    "executive_summary": "Stub executive summary.",
+    "recommended_products": ["Stub product"]
+}
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(LLM_DELAY)  # Simulated model latency
+        body = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps(STUB_ANALYSIS)}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class StubLLMServer(ThreadingHTTPServer):
+    request_queue_size = 128  # Default backlog of 5 drops bursts of connections
+
+def start_stub_server():
+    server = StubLLMServer(("127.0.0.1", 0), StubLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+CSV_CONTENT = b"""Date,Description,Amount
+2023-01-01,Sales,5000
+2023-01-02,Office Rent,-1000
+2023-02-01,Sales,5200
+2023-02-03,AWS Subscription,-300
+"""
+
+async def run_load(app, n):
+    import httpx
+
+    async def one(client, i):
+        files = {"file": (f"bench_{i}.csv", CSV_CONTENT, "text/csv")}
+        data = {"company_name": f"Bench Corp {i}", "industry": "Retail", "language": "English"}
+        resp = await client.post("/analyze", files=files, data=data)
+        resp.raise_for_status()
+        return json.loads(resp.json()["ai_analysis"])
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(client, i) for i in range(n)))
+        elapsed = time.perf_counter() - start
+    return elapsed, results
+
+def main():
+    server = start_stub_server()
+    tmp_dir = tempfile.mkdtemp(prefix="bench_llm_")
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ["LLM_CACHE_SIZE"] = "0"  # Every upload is identical; measure real LLM calls, not cache hits
+
+    import main as backend
+    from database import init_db
+
+    init_db()  # ASGITransport doesn't run the app's lifespan
+    # Warm-up request (imports, DB tables, HTTP connection pool)
+    asyncio.run(run_load(backend.app, 1))
+
+    elapsed_one, _ = asyncio.run(run_load(backend.app, 1))
+    elapsed_n, results = asyncio.run(run_load(backend.app, CONCURRENCY))
+    stubbed = sum(1 for r in results if r.get("executive_summary") == STUB_ANALYSIS["executive_summary"])
+
+    print(f"LLM stub latency:        {LLM_DELAY:.2f}s")
+    print(f"LLM_MAX_CONCURRENCY:     {backend.LLM_MAX_CONCURRENCY}")
+    print(f"1 upload:                {elapsed_one:.2f}s")
+    print(f"{CONCURRENCY} concurrent uploads:   {elapsed_n:.2f}s ({elapsed_n / elapsed_one:.2f}x single)")
+    print(f"Stubbed LLM answers:     {stubbed}/{CONCURRENCY}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
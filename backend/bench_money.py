@@ -0,0 +1,52 @@
+"""
+Benchmark for money totals: revenue/expense sums as float64, as Decimal and as
+int64 cents (money.py), with an order-independence check: the same ledger
+shuffled must give identical totals.
+
+Usage: python bench_money.py [rows ...]   (default: 100000 1000000)
+"""
+import sys
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from money import split_totals, to_cents
+
+SIZES = [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000]
+
+def float_totals(amounts):
+    return float(amounts[amounts > 0].sum()), float(-amounts[amounts < 0].sum())
+
+def decimal_totals(amounts):
+    values = [Decimal(f"{a:.2f}") for a in amounts]
+    return sum(v for v in values if v > 0), -sum(v for v in values if v < 0)
+
+def cents_totals(amounts):
+    totals = split_totals(to_cents(amounts))
+    return totals["revenue_cents"], totals["expense_cents"]
+
+def timed(func, amounts):
+    start = time.perf_counter()
+    result = func(amounts)
+    return result, time.perf_counter() - start
+
+def main():
+    rng = np.random.default_rng(42)
+    for rows in SIZES:
+        amounts = np.round(rng.lognormal(6, 2, rows) * np.where(rng.random(rows) < 0.35, 1.0, -1.0), 2)
+        shuffled = rng.permutation(amounts)
+
+        line = f"{rows:>9} rows"
+        stable = {}
+        for name, func in (("float", float_totals), ("decimal", decimal_totals), ("cents", cents_totals)):
+            result, seconds = timed(func, amounts)
+            stable[name] = result == func(shuffled)
+            line += f" | {name} {seconds * 1000:9.2f}ms"
+        exact = cents_totals(amounts) == tuple(int(t * 100) for t in decimal_totals(amounts))
+        print(f"{line} | order-independent: " + ", ".join(f"{k}={v}" for k, v in stable.items()) + f" | cents == decimal: {exact}")
+        if not (stable["cents"] and exact):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
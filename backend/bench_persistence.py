@@ -0,0 +1,104 @@
+"""
+Benchmark for analysis persistence: the previous three-commit save, the single
+unit of work (save_records) and the write-behind buffer, in analyses per second.
+The "repeat uploads" mode saves every analysis for the same few companies, where
+get-or-create resolves the company from the id cache without writing.
+
+Runs against a local SQLite file, plus any extra database URLs given on the
+command line or in BENCH_POSTGRES_URL (e.g. a throwaway local Postgres):
+
+Usage: python bench_persistence.py [analyses] [database_url ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+tmp_dir = tempfile.mkdtemp(prefix="bench_persist_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'import.db')}"
+
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Company, FinancialReport, ComplianceLog, make_engine
+from persistence import AnalysisRecord, save_records, WriteBehindBuffer, company_key, company_ids
+
+ANALYSES = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+URLS = [f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"] + sys.argv[2:]
+if os.getenv("BENCH_POSTGRES_URL"):
+    URLS.append(os.getenv("BENCH_POSTGRES_URL"))
+
+SUMMARY = {"Total Revenue": 149200.0, "Total Expenses": 79600.0, "Net Profit": 69600.0}
+AI_INSIGHT = '{"creditworthiness": "High", "executive_summary": "Bench."}'
+
+def legacy_save(db, record):
+    """The previous save path: three commits plus a refresh per analysis."""
+    name_key, industry_key = company_key(record.company_name, record.industry)
+    company = Company(name=record.company_name, industry=record.industry, name_key=name_key, industry_key=industry_key)
+    db.add(company)
+    db.commit()
+    db.refresh(company)
+    db.add(FinancialReport(
+        company_id=company.id, upload_filename=record.filename, revenue=record.revenue,
+        expenses=record.expenses, net_profit=record.net_profit,
+        health_score=record.health_score, ai_analysis_text=record.ai_analysis_text
+    ))
+    db.commit()
+    db.add(ComplianceLog(
+        company_name=record.company_name, action_type="AI Risk Assessment",
+        ai_model="GPT-5", decision_summary=record.verdict
+    ))
+    db.commit()
+
+def run_per_analysis(session_factory, records, save):
+    db = session_factory()
+    try:
+        for record in records:
+            save(db, record)
+    finally:
+        db.close()
+
+def run_write_behind(session_factory, records):
+    buffer = WriteBehindBuffer(session_factory, max_batch=50, interval=0.5)
+    for record in records:
+        buffer.add(record)
+    buffer.close()
+
+def main():
+    records = [
+        AnalysisRecord(f"Bench Co {i}", "Retail", "bench.csv", SUMMARY, 80, AI_INSIGHT)
+        for i in range(ANALYSES)
+    ]
+    repeat_records = [
+        AnalysisRecord(f"Bench Co {i % 5}", "Retail", "bench.csv", SUMMARY, 80, AI_INSIGHT)
+        for i in range(ANALYSES)
+    ]
+    single = lambda db, r: save_records(db, [r])
+    modes = [
+        ("legacy (3 commits)", lambda sf: run_per_analysis(sf, records, legacy_save)),
+        ("single unit of work", lambda sf: run_per_analysis(sf, records, single)),
+        ("write-behind (batch 50)", lambda sf: run_write_behind(sf, records)),
+        ("repeat uploads (5 cos)", lambda sf: run_per_analysis(sf, repeat_records, single)),
+    ]
+
+    for url in URLS:
+        try:
+            engine = make_engine(url)
+            Base.metadata.create_all(bind=engine)
+        except Exception as e:
+            print(f"{url.split('@')[-1]}: skipped ({e.__class__.__name__}: {e})")
+            continue
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        print(f"{engine.dialect.name} ({url.split('@')[-1]}), {ANALYSES} analyses")
+        for name, run in modes:
+            # Fresh tables per mode, so each one creates its companies from scratch
+            Base.metadata.drop_all(bind=engine)
+            Base.metadata.create_all(bind=engine)
+            company_ids.clear()
+            start = time.perf_counter()
+            run(session_factory)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<24} {ANALYSES / elapsed:10.1f} analyses/s  ({elapsed:.2f}s)")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark for the month-end report run: one-pagers for every company's latest
+stored report, streamed as a ZIP. Compares rendering in process, across the
+report process pool, and a repeat run served from report_cache.
+
+Usage: python bench_reports.py [companies]
+"""
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from database import make_engine, Base, Company, FinancialReport
+from sqlalchemy.orm import sessionmaker
+from crypto_utils import encrypt_values
+import reports
+from reports import stored_report_payloads, render_reports, stream_zip, report_filename, report_cache
+
+COMPANIES = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+def seed(db):
+    companies = [
+        Company(name=f"Company {i}", industry="Retail", name_key=f"company {i}", industry_key="retail")
+        for i in range(COMPANIES)
+    ]
+    db.add_all(companies)
+    db.flush()
+    revenue = [str(10000 + i) for i in range(COMPANIES)]
+    expenses = [str(6000 + i) for i in range(COMPANIES)]
+    profit = [str(4000) for _ in range(COMPANIES)]
+    summary = json.dumps({"executive_summary": "Revenue is stable and costs are under control."})
+    db.add_all(
+        FinancialReport(company_id=company.id, revenue=r, expenses=e, net_profit=p, health_score=70, ai_analysis_text=summary)
+        for company, r, e, p in zip(companies, encrypt_values(revenue), encrypt_values(expenses), encrypt_values(profit))
+    )
+    db.commit()
+    return [company.id for company in companies]
+
+def run(db, company_ids):
+    start = time.perf_counter()
+    payloads = stored_report_payloads(db, company_ids=company_ids)
+    load_s = time.perf_counter() - start
+    names = [report_filename(name, report_id) for report_id, name, _ in payloads]
+    size = sum(len(chunk) for chunk in stream_zip(zip(names, render_reports([(n, r) for _, n, r in payloads]))))
+    return load_s, time.perf_counter() - start, size
+
+def main():
+    engine = make_engine()
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    company_ids = seed(db)
+    print(f"{COMPANIES} companies, {reports.REPORT_WORKERS} report workers")
+
+    modes = [("in process", 10 ** 9), ("process pool", 1)]
+    for label, parallel_min in modes:
+        report_cache.clear()
+        reports.REPORT_PARALLEL_MIN = parallel_min
+        load_s, total_s, size = run(db, company_ids)
+        print(f"  {label:14s} load {load_s:6.2f}s  total {total_s:6.2f}s  ({size / 1e6:.1f} MB zip)")
+
+    load_s, total_s, size = run(db, company_ids)
+    print(f"  {'cached':14s} load {load_s:6.2f}s  total {total_s:6.2f}s  {report_cache.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+End-to-end benchmark suite over deterministic synthetic inputs (bench_data.py).
+
+Cases: the CSV, PDF and GSTR-1 parsers, auto_categorize, generate_forecast,
+generate_pdf_report, and the full /analyze route through the FastAPI
+TestClient. The route case uses a stubbed LLM, a throwaway SQLite database and
+no analysis cache. Each case runs in its own subprocess, so that its peak RSS
+is its own. The suite records throughput, p50/p99 latency and peak RSS.
+
+Usage:
+  python bench_suite.py                              # run, print a table
+  python bench_suite.py --save bench_baseline.json   # record a baseline
+  python bench_suite.py --compare bench_baseline.json [--tolerance 0.25]
+  python bench_suite.py --scale small --cases parse_pdf,analyze_route
+
+--compare exits with status 1 when a case's p50 latency or peak RSS is more
+than the tolerance above the baseline. Compare runs from the same machine.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+SCALES = {
+    # case -> input size (rows, pages, invoices, reports or ledger rows per request)
+    "small":  {"parse_csv": 5_000,   "parse_pdf": 5,  "parse_gstr1": 2_000,  "auto_categorize": 20_000,
+               "generate_forecast": 20_000,  "generate_pdf_report": 20, "analyze_route": 2_000},
+    "medium": {"parse_csv": 50_000,  "parse_pdf": 20, "parse_gstr1": 20_000, "auto_categorize": 200_000,
+               "generate_forecast": 200_000, "generate_pdf_report": 100, "analyze_route": 20_000},
+    "large":  {"parse_csv": 500_000, "parse_pdf": 100, "parse_gstr1": 200_000, "auto_categorize": 2_000_000,
+               "generate_forecast": 2_000_000, "generate_pdf_report": 1_000, "analyze_route": 200_000},
+}
+UNITS = {"parse_csv": "rows", "parse_pdf": "pages", "parse_gstr1": "invoices", "auto_categorize": "rows",
+         "generate_forecast": "rows", "generate_pdf_report": "reports", "analyze_route": "rows"}
+CASES = list(UNITS)
+RESULT_PREFIX = "BENCH_RESULT "  # Marks the child's result line among any log output
+
+def _proc_status_mb(field):
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024  # kB
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    """
+    Resets the kernel's peak RSS mark (Linux), so the peak measured afterwards
+    belongs to the timed runs rather than to building the inputs.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+def rss_mb():
+    current = _proc_status_mb("VmRSS")
+    return current if current is not None else peak_rss_mb()
+
+def _stub_llm(main):
+    """
+    Replaces the OpenRouter client with a canned JSON answer, so the route case
+    measures this service rather than the network.
+    """
+    from types import SimpleNamespace
+
+    content = json.dumps({
+        "creditworthiness": "Medium",
+        "risk_assessment": "Expenses are rising faster than revenue in the last quarter.",
+        "cost_optimization": ["Renegotiate supplier terms", "Consolidate software subscriptions"],
+        "executive_summary": "Stable revenue with moderate margins.",
+        "recommended_products": ["Working capital loan"],
+    })
+
+    async def create(**kwargs):
+        message = SimpleNamespace(content=content)
+        usage = SimpleNamespace(prompt_tokens=350, completion_tokens=180)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    main.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+def setup_case(case, size):
+    """
+    Builds the case's input outside the timed loop. Returns a zero-argument
+    callable that runs the case once.
+    """
+    import bench_data
+
+    if case == "parse_csv":
+        from csv_stream import read_csv_stream
+        data = bench_data.csv_ledger(size)
+        return lambda: read_csv_stream(io.BytesIO(data))
+    if case == "parse_pdf":
+        from pdf_parser import parse_pdf
+        data = bench_data.pdf_statement(size)
+        return lambda: parse_pdf(data)
+    if case == "parse_gstr1":
+        from gst_parser import parse_gstr1
+        data = bench_data.gstr1_json(size)
+        return lambda: parse_gstr1(io.BytesIO(data))
+    if case == "auto_categorize":
+        from bookkeeping import auto_categorize
+        df = bench_data.make_ledger(size)
+        return lambda: auto_categorize(df.copy())
+    if case == "generate_forecast":
+        from forecasting import generate_forecast
+        df = bench_data.make_ledger(size)
+        return lambda: generate_forecast(df.copy())
+    if case == "generate_pdf_report":
+        from reports import generate_pdf_report
+        result = bench_data.report_result()
+        # A batch per call: one render is well under a millisecond, too short to time on its own
+        return lambda: [generate_pdf_report(f"Synthetic Traders {i}", result) for i in range(size)]
+    if case == "analyze_route":
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+        os.environ["LLM_CACHE_SIZE"] = "0"
+        os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        import main
+        from fastapi.testclient import TestClient
+        _stub_llm(main)
+        client = TestClient(main.app)
+        client.__enter__()  # Runs the lifespan (schema, job queue) once for the whole case
+        data = bench_data.csv_ledger(size)
+        form = {"company_name": "Synthetic Traders", "industry": "Retail"}
+
+        def run():
+            response = client.post("/analyze", files={"file": ("ledger.csv", data, "text/csv")}, data=form)
+            assert response.status_code == 200, response.text
+        return run
+    raise ValueError(f"Unknown case '{case}'")
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_case(case, size, iterations, warmup=1):
+    """
+    Times one case in this process. Latencies are per call; throughput is
+    input units per second at the median latency. setup_rss_mb is the RSS
+    with inputs built and one warm-up call done; peak_rss_mb is the peak during
+    the timed calls (since process start where the peak can't be reset).
+    """
+    func = setup_case(case, size)
+    for _ in range(warmup):
+        func()
+    setup_rss = rss_mb()
+    reset_peak_rss()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p50 = percentile(latencies, 0.50)
+    return {
+        "size": size,
+        "unit": UNITS[case],
+        "iterations": iterations,
+        "p50_ms": round(p50 * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "throughput_per_s": round(size / p50, 1) if p50 > 0 else None,
+        "setup_rss_mb": round(setup_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def run_isolated(case, size, iterations):
+    command = [sys.executable, os.path.abspath(__file__), "--child", case, "--size", str(size), "--iterations", str(iterations)]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise RuntimeError(f"{case} failed:\n{completed.stderr[-2000:]}")
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of p50 latency or peak RSS beyond tolerance, as printable lines.
+    Cases missing from the baseline, or measured at another size, are skipped.
+    """
+    regressions = []
+    for case, result in results.items():
+        base = baseline.get("cases", {}).get(case)
+        if base is None or base["size"] != result["size"]:
+            continue
+        for metric in ("p50_ms", "peak_rss_mb"):
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{case}: {metric} {base[metric]} -> {result[metric]} (+{result[metric] / base[metric] - 1:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated subset of: " + ", ".join(CASES))
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--save", metavar="FILE", help="Write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown/growth vs the baseline (0.25 = 25%%)")
+    parser.add_argument("--child", metavar="CASE", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(RESULT_PREFIX + json.dumps(run_case(args.child, args.size, args.iterations)), flush=True)
+        return
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in UNITS]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    print(f"scale={args.scale} iterations={args.iterations} python={platform.python_version()} cpus={os.cpu_count()}")
+    print(f"  {'case':20s} {'size':>10s}  {'p50 ms':>9s}  {'p99 ms':>9s}  {'throughput':>18s}  {'peak RSS':>9s}")
+    results = {}
+    for case in cases:
+        size = SCALES[args.scale][case]
+        result = results[case] = run_isolated(case, size, args.iterations)
+        throughput = f"{result['throughput_per_s']:,.0f} {result['unit']}/s"
+        print(f"  {case:20s} {size:>10,}  {result['p50_ms']:9.2f}  {result['p99_ms']:9.2f}  {throughput:>18s}  {result['peak_rss_mb']:7.1f}MB")
+
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "scale": args.scale,
+            "iterations": args.iterations,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "cases": results,
+    }
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions vs {args.compare} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions vs {args.compare} (tolerance {args.tolerance:.0%}).")
+
+if __name__ == "__main__":
+    main()
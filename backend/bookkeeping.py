@@ -1,4 +1,12 @@
+import os
+import re
+import numpy as np
 import pandas as pd
+from ledger import prepare_ledger
+from money import frame_cents, units
+from log_utils import get_logger
+
+logger = get_logger("bookkeeping")
 
 # Standard SME Categories
 CATEGORIES = {
@@ -12,53 +20,105 @@ CATEGORIES = {
     "Financial": ["bank", "fee", "interest", "insurance", "loan", "credit card"]
 }
 
-def auto_categorize(df):
+def _build_category_matcher(categories):
+    """
+    Compiles every keyword into one regex with one lookahead branch per category.
+    Branches are tried in CATEGORIES order and each ends in an empty marker group,
+    so match.lastindex is the first category with a keyword anywhere in the text.
+    """
+    branches = []
+    for keywords in categories.values():
+        alternation = "|".join(re.escape(kw) for kw in keywords)
+        branches.append(f"(?=.*?(?:{alternation}))()")
+    return re.compile("|".join(branches), re.DOTALL)
+
+CATEGORY_MATCHER = _build_category_matcher(CATEGORIES)
+CATEGORY_LABELS = list(CATEGORIES) + ["Miscellaneous", "Revenue"]
+# The 'category' column's dtype; categories sorted so groupby output stays alphabetical
+CATEGORY_DTYPE = pd.CategoricalDtype(sorted(CATEGORY_LABELS))
+_LABEL_CODES = np.array([CATEGORY_DTYPE.categories.get_loc(label) for label in CATEGORY_LABELS], dtype=np.int8)
+_MISC_INDEX = len(CATEGORY_LABELS) - 2
+# Most lowercased descriptions a memo (see classify_transactions) remembers
+CLASSIFY_MEMO_SIZE = int(os.getenv("CLASSIFY_MEMO_SIZE", "200000"))
+
+def _category_index(text):
+    match = CATEGORY_MATCHER.match(text)
+    return match.lastindex - 1 if match else _MISC_INDEX
+
+def classify_transactions(descriptions, amounts, memo=None):
+    """
+    Vectorized classification: "Revenue" for positive amounts, otherwise the first
+    matching category for the lowercased description, else "Miscellaneous".
+    Each distinct description is lowercased and matched only once (for
+    categorical descriptions, each category). Returns a Categorical of CATEGORY_DTYPE.
+    memo (a dict kept by the caller across calls, e.g. over the chunks of one
+    upload) saves matching recurring descriptions again; it stops growing at
+    CLASSIFY_MEMO_SIZE entries.
+    """
+    if isinstance(descriptions.dtype, pd.CategoricalDtype):
+        codes, uniques = descriptions.cat.codes.to_numpy(), descriptions.cat.categories
+    else:
+        codes, uniques = pd.factorize(descriptions)
+    # Lowercased once per distinct value; code -1 (missing) indexes the '' appended last
+    uniques = pd.Index(uniques, dtype=object).astype(str).str.lower().tolist() + ['']
+    if memo is None:
+        indexes = map(_category_index, uniques)
+    else:
+        def remembered(text):
+            index = memo.get(text)
+            if index is None:
+                index = _category_index(text)
+                if len(memo) < CLASSIFY_MEMO_SIZE:
+                    memo[text] = index
+            return index
+        indexes = map(remembered, uniques)
+    unique_idx = np.fromiter(indexes, dtype=np.intp, count=len(uniques))
+    labels = _LABEL_CODES[unique_idx[codes]]
+    revenue = _LABEL_CODES[-1]
+    return pd.Categorical.from_codes(np.where(np.asarray(amounts) > 0, revenue, labels), dtype=CATEGORY_DTYPE)
+
+def auto_categorize(df, ledger=None):
     """
     Categorizes transactions based on description keywords.
     Handles 'Description' vs 'description' column case sensitivity.
+    Works on ledger.frame (dates already parsed) when given.
+    Breakdown values are int cents (value_cents); bookkeeping_response()
+    converts them for the API.
     """
     try:
         # 0. Standardize Columns to lowercase
         df.columns = df.columns.str.lower().str.strip()
+        if ledger is None:
+            ledger = prepare_ledger(df)
+        df = ledger.frame
         
         # Check required columns
         if 'description' not in df.columns or 'amount' not in df.columns:
-            print("Bookkeeping Error: Missing 'description' or 'amount' columns.")
+            logger.warning("Bookkeeping Error: Missing 'description' or 'amount' columns.")
             return None
 
-        # Helper function
-        def classify(desc, amount):
-            if amount > 0:
-                return "Revenue"
-            desc = str(desc).lower()
-            for cat, keywords in CATEGORIES.items():
-                for kw in keywords:
-                    if kw in desc:
-                        return cat
-            return "Miscellaneous"
-
-        # Apply classification
-        df['category'] = df.apply(lambda x: classify(x.get('description', ''), x.get('amount', 0)), axis=1)
+        # Apply classification (kept beside the shared frame rather than added to it)
+        category = pd.Series(classify_transactions(df['description'], df['amount']), index=df.index, name='category')
         
-        # 1. Expense Breakdown (amount < 0)
-        expense_df = df[df['amount'] < 0].copy()
-        if not expense_df.empty:
-            expense_df['abs_amount'] = expense_df['amount'].abs()
-            breakdown = expense_df.groupby('category')['abs_amount'].sum().reset_index()
-            breakdown_list = breakdown.rename(columns={'abs_amount': 'value', 'category': 'name'}).to_dict('records')
+        # 1. Expense Breakdown (amount < 0), summed exactly in int cents without copying the frame
+        expense_cents = -frame_cents(df)
+        is_expense = expense_cents > 0
+        if is_expense.any():
+            breakdown = pd.Series(expense_cents[is_expense]).groupby(category.array[is_expense], observed=True).sum()
+            breakdown_list = [{"name": name, "value_cents": int(value)} for name, value in breakdown.items()]
         else:
             breakdown_list = []
         
         # 2. Recent Transactions (Top 20)
-        # Ensure 'date' exists
+        # Ensure 'date' exists (newest dated rows first)
         if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            recent_df = df.dropna(subset=['date']).sort_values('date', ascending=False).head(20).copy()
-            recent_df['date'] = recent_df['date'].dt.strftime('%Y-%m-%d')
-            recent_transactions = recent_df[['date', 'description', 'amount', 'category']].to_dict('records')
+            newest = ledger.newest_positions(20)
+            recent_df = df.iloc[newest][['date', 'description', 'amount']]
+            recent_df = recent_df.assign(date=recent_df['date'].dt.strftime('%Y-%m-%d'), category=category.to_numpy()[newest])
+            recent_transactions = recent_df.to_dict('records')
         else:
              # Fallback if no date column
-             recent_transactions = df.head(20)[['description', 'amount', 'category']].to_dict('records')
+             recent_transactions = df.head(20)[['description', 'amount']].assign(category=category.to_numpy()[:20]).to_dict('records')
              for t in recent_transactions: t['date'] = 'N/A'
 
         return {
@@ -67,5 +127,16 @@ def auto_categorize(df):
         }
 
     except Exception as e:
-        print(f"Bookkeeping Error: {e}")
-        return None
\ No newline at end of file
+        logger.error("Bookkeeping Error: %s", e)
+        return None
+
+def bookkeeping_response(bookkeeping_data):
+    """
+    auto_categorize's result as returned by the API: breakdown values in units.
+    """
+    if bookkeeping_data is None:
+        return None
+    return {
+        **bookkeeping_data,
+        "breakdown": [{"name": item["name"], "value": units(item["value_cents"])} for item in bookkeeping_data["breakdown"]]
+    }
\ No newline at end of file
@@ -0,0 +1,101 @@
+import base64
+import csv
+import datetime
+import io
+import json
+
+from sqlalchemy import select, tuple_
+
+from database import ComplianceLog
+
+EXPORT_BATCH_ROWS = 1000  # Rows per keyset query while streaming an export
+MAX_PAGE_SIZE = 1000
+LOG_FIELDS = ["id", "company_name", "action_type", "ai_model", "decision_summary", "timestamp"]
+
+def encode_cursor(timestamp, log_id):
+    """
+    Opaque cursor for the last row of a page: its (timestamp, id) sort key.
+    """
+    raw = f"{timestamp.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Inverse of encode_cursor. Raises ValueError for anything it didn't produce.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, log_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(timestamp), int(log_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def query_logs(db, company_name=None, action_type=None, ai_model=None, since=None, until=None, cursor=None, limit=5):
+    """
+    One page of compliance logs, newest first, using keyset pagination on
+    (timestamp, id): each page starts strictly after the previous page's last
+    row, so page N costs the same as page 1 and inserts don't shift pages.
+    Company and action-type filters are served by the composite
+    (column, timestamp, id) indexes on compliance_logs.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    columns = ComplianceLog.__table__.c
+    stmt = select(*[columns[name] for name in LOG_FIELDS])
+    if company_name:
+        stmt = stmt.where(columns.company_name == company_name)
+    if action_type:
+        stmt = stmt.where(columns.action_type == action_type)
+    if ai_model:
+        stmt = stmt.where(columns.ai_model == ai_model)
+    if since:
+        stmt = stmt.where(columns.timestamp >= since)
+    if until:
+        stmt = stmt.where(columns.timestamp < until)
+    if cursor:
+        stmt = stmt.where(tuple_(columns.timestamp, columns.id) < tuple_(*decode_cursor(cursor)))
+
+    # One extra row tells us whether another page exists
+    stmt = stmt.order_by(columns.timestamp.desc(), columns.id.desc()).limit(limit + 1)
+    rows = [dict(row._mapping) for row in db.execute(stmt)]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+    return rows, next_cursor
+
+def iter_logs(db, batch_rows=EXPORT_BATCH_ROWS, **filters):
+    """
+    Yields every matching log, newest first, one keyset page at a time, so at
+    most batch_rows rows are in memory however large the export is.
+    """
+    cursor = None
+    while True:
+        rows, cursor = query_logs(db, cursor=cursor, limit=batch_rows, **filters)
+        yield rows
+        if cursor is None:
+            break
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+def export_ndjson(db, **filters):
+    """
+    Streams matching logs as newline-delimited JSON, one chunk per batch.
+    """
+    for rows in iter_logs(db, **filters):
+        if rows:
+            yield "".join(json.dumps({k: _export_value(v) for k, v in row.items()}) + "\n" for row in rows)
+
+def export_csv(db, **filters):
+    """
+    Streams matching logs as CSV with a header row, one chunk per batch.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=LOG_FIELDS)
+    writer.writeheader()
+    for rows in iter_logs(db, **filters):
+        writer.writerows({k: _export_value(v) for k, v in row.items()} for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -1,10 +1,23 @@
 from cryptography.fernet import Fernet
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
+from log_utils import get_logger
 
 # Generate a key if not exists (In prod, store this in .env or KMS)
-KEY_FILE = "secret.key"
+KEY_FILE = os.getenv("ENCRYPTION_KEY_FILE", "secret.key")
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", "1"))  # Threads for bulk encrypt/decrypt; 1 = inline
+CRYPTO_CHUNK_SIZE = 2000  # Values per thread-pool task
+
+logger = get_logger("crypto")
+
+_cipher = None
+_cipher_lock = threading.Lock()
 
 def load_key():
+    # ENCRYPTION_KEY (a Fernet key) wins over the key file
+    if os.getenv("ENCRYPTION_KEY"):
+        return os.getenv("ENCRYPTION_KEY").encode()
     if not os.path.exists(KEY_FILE):
         key = Fernet.generate_key()
         with open(KEY_FILE, "wb") as key_file:
@@ -14,14 +27,21 @@ def load_key():
             key = key_file.read()
     return key
 
-cipher_suite = Fernet(load_key())
+def get_cipher():
+    """Fernet cipher for the app key, loaded on first use rather than at import"""
+    global _cipher
+    if _cipher is None:
+        with _cipher_lock:
+            if _cipher is None:
+                _cipher = Fernet(load_key())
+    return _cipher
 
 def encrypt_value(value):
     """Encrypts a value (int, float, str) -> returns str (ciphertext)"""
     if value is None:
         return None
     val_str = str(value)
-    encrypted_bytes = cipher_suite.encrypt(val_str.encode('utf-8'))
+    encrypted_bytes = get_cipher().encrypt(val_str.encode('utf-8'))
     return encrypted_bytes.decode('utf-8')
 
 def decrypt_value(token, type_cast=str):
@@ -29,9 +49,70 @@ def decrypt_value(token, type_cast=str):
     if not token:
         return None
     try:
-        decrypted_bytes = cipher_suite.decrypt(token.encode('utf-8'))
+        decrypted_bytes = get_cipher().decrypt(token.encode('utf-8'))
         decrypted_str = decrypted_bytes.decode('utf-8')
         return type_cast(decrypted_str)
     except Exception as e:
-        print(f"Decryption Error: {e}")
+        logger.warning("Decryption Error: %s", e)
         return None
+
+def _encrypt_chunk(values):
+    encrypt = get_cipher().encrypt
+    return [None if value is None else encrypt(str(value).encode('utf-8')).decode('utf-8') for value in values]
+
+def _decrypt_chunk(tokens, type_cast):
+    """Decrypts a list of tokens -> (values, failure count); failures become None"""
+    decrypt = get_cipher().decrypt
+    values = []
+    failures = 0
+    for token in tokens:
+        if not token:
+            values.append(None)
+            continue
+        try:
+            values.append(type_cast(decrypt(token.encode('utf-8')).decode('utf-8')))
+        except Exception:
+            values.append(None)
+            failures += 1
+    return values, failures
+
+def _run_chunked(func, items, workers):
+    """Applies func to CRYPTO_CHUNK_SIZE slices of items, across threads when workers > 1, in order"""
+    chunks = [items[i:i + CRYPTO_CHUNK_SIZE] for i in range(0, len(items), CRYPTO_CHUNK_SIZE)]
+    if workers <= 1 or len(chunks) <= 1:
+        return [func(chunk) for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks)), thread_name_prefix="crypto") as pool:
+        return list(pool.map(func, chunks))
+
+def encrypt_values(values, workers=CRYPTO_WORKERS):
+    """Encrypts a list/Series of values -> list of str ciphertexts (None stays None)"""
+    values = list(values)
+    return [token for chunk in _run_chunked(_encrypt_chunk, values, workers) for token in chunk]
+
+def decrypt_values(tokens, type_cast=str, workers=CRYPTO_WORKERS):
+    """
+    Decrypts a list/Series of tokens -> list of values cast to type_cast.
+    Bad tokens become None, like decrypt_value, but are reported in one line
+    per batch instead of one log line per value.
+    """
+    tokens = list(tokens)
+    results = _run_chunked(lambda chunk: _decrypt_chunk(chunk, type_cast), tokens, workers)
+    failures = sum(failed for _, failed in results)
+    if failures:
+        logger.warning("Decryption Error: %d of %d values could not be decrypted", failures, len(tokens))
+    return [value for values, _ in results for value in values]
+
+def decrypt_columns(rows, columns, type_cast=float, workers=CRYPTO_WORKERS):
+    """
+    Decrypts the given columns of a DataFrame or a list of dict rows in one batch.
+    DataFrames get a decrypted copy; dict rows are updated in place and returned.
+    """
+    if hasattr(rows, "columns"):
+        rows = rows.copy()
+        for column in columns:
+            rows[column] = decrypt_values(rows[column], type_cast, workers)
+        return rows
+    for column in columns:
+        for row, value in zip(rows, decrypt_values([row.get(column) for row in rows], type_cast, workers)):
+            row[column] = value
+    return rows
@@ -0,0 +1,97 @@
+import os
+import pandas as pd
+
+from transactions import compact_transactions, concat_transactions, date_format, categorical_descriptions
+from money import split_totals
+from aggregates import RunningAggregates
+
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "50000"))
+
+# Map common column names to standard 'amount', 'date' and 'description'
+COLUMN_MAP = {
+    'amount': 'amount', 'value': 'amount', 'total': 'amount',
+    'date': 'date', 'transaction_date': 'date', 'time': 'date',
+    'desc': 'description', 'memo': 'description', 'description': 'description'
+}
+
+def iter_csv_chunks(fileobj, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Streams a CSV ledger from a binary file object in chunks of chunk_rows.
+    Only the columns used downstream (date, description, amount) are kept and
+    each chunk is converted to the compact transaction frame (transactions.py).
+    Returns (columns, chunks): the standard column names and an iterator of
+    chunk frames, None when there is no amount column.
+    """
+    fileobj.seek(0)
+    header = pd.read_csv(fileobj, nrows=0, encoding='utf-8').columns
+    fileobj.seek(0)
+
+    # First matching raw column wins for each standard name
+    selected = {}
+    for raw in header:
+        std = COLUMN_MAP.get(str(raw).strip().lower())
+        if std and std not in selected.values():
+            selected[raw] = std
+
+    columns = list(selected.values())
+    if 'amount' not in columns:
+        return columns, None
+
+    text_cols = {raw: str for raw, std in selected.items() if std != 'amount'}
+    reader = pd.read_csv(
+        fileobj, usecols=list(selected), dtype=text_cols,
+        chunksize=chunk_rows, encoding='utf-8'
+    )
+
+    def chunks():
+        dates_format = categorical = None
+        for index, chunk in enumerate(reader):
+            chunk = chunk.rename(columns=selected)
+            if index == 0:
+                # Decided once from the first chunk so every chunk is typed the same way
+                if 'date' in chunk.columns:
+                    dates_format = date_format(chunk['date'])
+                if 'description' in chunk.columns:
+                    categorical = categorical_descriptions(chunk['description'])
+            # Compacted per chunk, so the raw date/description strings of one chunk at a time are alive
+            yield compact_transactions(chunk, dates_format, categorical)
+    return columns, chunks()
+
+def read_csv_stream(fileobj, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    The whole CSV as one compact frame, for callers that need every row (the
+    batch de-duplication, appends). Revenue/expense totals (int cents) are
+    accumulated chunk by chunk.
+    Returns (df, totals); totals is None when there is no amount column.
+    """
+    columns, chunks = iter_csv_chunks(fileobj, chunk_rows)
+    if chunks is None:
+        return pd.DataFrame(columns=columns), None
+
+    frames = []
+    revenue_cents = 0
+    expense_cents = 0
+    for chunk in chunks:
+        chunk_totals = split_totals(chunk['amount_cents'])
+        revenue_cents += chunk_totals["revenue_cents"]
+        expense_cents += chunk_totals["expense_cents"]
+        frames.append(chunk)
+
+    df = concat_transactions(frames) if frames else pd.DataFrame(columns=columns)
+    totals = {"revenue_cents": revenue_cents, "expense_cents": expense_cents}
+    return df, totals
+
+def aggregate_csv_stream(fileobj, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Folds a CSV ledger into RunningAggregates one chunk at a time; each chunk is
+    dropped once counted, so memory is bounded by the chunk size (plus one
+    bucket per month and category), not by the number of rows.
+    Returns (columns, aggregates); aggregates is None when there is no amount column.
+    """
+    columns, chunks = iter_csv_chunks(fileobj, chunk_rows)
+    if chunks is None:
+        return columns, None
+    aggregates = RunningAggregates()
+    for chunk in chunks:
+        aggregates.update(chunk, batch_is_newer=False)
+    return columns, aggregates
@@ -1,4 +1,5 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -17,7 +18,7 @@ try:
     }
 
     print("Attempting to call LLM...")
-    result = analyze_with_llm(dummy_summary)
+    result = asyncio.run(analyze_with_llm(dummy_summary))
     print("\nResult:")
     print(result)
 
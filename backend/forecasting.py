@@ -1,67 +1,433 @@
 import pandas as pd
 import numpy as np
 # from sklearn.linear_model import LinearRegression # Removed to save memory on Render Free Tier
-from datetime import timedelta
+from ledger import prepare_ledger
+from money import CENTS_PER_UNIT, to_cents
+from log_utils import get_logger
 
-def generate_forecast(df):
+logger = get_logger("forecasting")
+
+# NumPy-only forecasting engine. Every model works on a matrix of monthly series
+# (one row per series, right-aligned: the last column is each series' latest month,
+# shorter series are left-padded with NaN), so one call fits any number of series.
+FORECAST_MONTHS = 6
+SEASON_LENGTH = 12        # Monthly data, yearly seasonality
+BACKTEST_ORIGINS = 6      # Rolling origins (the last N months are each held out in turn)
+BACKTEST_HORIZON = 3      # Months forecast from each origin
+INTERVAL_Z = 1.2816       # 80% prediction interval
+HOLT_ALPHAS = np.array([0.2, 0.5, 0.8])
+HOLT_BETAS = np.array([0.05, 0.2])
+MODELS = ("naive", "linear_trend", "seasonal_naive", "holt")
+
+def _valid_counts(Y):
+    return (~np.isnan(Y)).sum(axis=1)
+
+def _last_valid(Y):
+    """
+    Each row's latest observed value (rows are right-aligned, so the last
+    column unless the row is empty).
+    """
+    return Y[:, -1] if Y.shape[1] else np.full(Y.shape[0], np.nan)
+
+def _fit_naive(Y, horizon):
+    """
+    Latest month carried forward (random walk). NaN rows have no points.
+    """
+    steps = np.arange(1, horizon + 1)
+    point = np.repeat(_last_valid(Y)[:, None], horizon, axis=1)
+    diffs = np.diff(Y, axis=1)
+    with np.errstate(invalid="ignore"):
+        diff_counts = (~np.isnan(diffs)).sum(axis=1)
+        sigma = np.where(diff_counts > 0, np.sqrt(np.nansum(diffs ** 2, axis=1) / np.maximum(diff_counts, 1)), 0.0)
+    return point, sigma[:, None] * np.sqrt(steps)
+
+def _fit_linear_trend(Y, horizon):
+    """
+    Least-squares line through each row's observed months.
+    Returns (point, sigma), both (series, horizon); NaN rows have < 2 points.
+    """
+    T = Y.shape[1]
+    valid = ~np.isnan(Y)
+    n = valid.sum(axis=1)
+    t = np.where(valid, np.arange(T), 0.0)
+    y = np.where(valid, Y, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t_mean = t.sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dt = np.where(valid, t - t_mean[:, None], 0.0)
+        sxx = (dt ** 2).sum(axis=1)
+        slope = np.where(sxx > 0, (dt * (y - y_mean[:, None])).sum(axis=1) / sxx, 0.0)
+        intercept = y_mean - slope * t_mean
+        residuals = np.where(valid, y - (intercept[:, None] + slope[:, None] * np.arange(T)), 0.0)
+        sigma = np.where(n > 2, np.sqrt((residuals ** 2).sum(axis=1) / (n - 2)), 0.0)
+
+        future_t = T - 1 + np.arange(1, horizon + 1)
+        point = intercept[:, None] + slope[:, None] * future_t
+        leverage = 1 + 1 / n[:, None] + np.where(sxx[:, None] > 0, (future_t - t_mean[:, None]) ** 2 / sxx[:, None], 0.0)
+        sigma_h = sigma[:, None] * np.sqrt(leverage)
+
+    too_short = n < 2
+    point[too_short] = np.nan
+    sigma_h[too_short] = np.nan
+    return point, sigma_h
+
+def _fit_seasonal_naive(Y, horizon, season=SEASON_LENGTH):
+    """
+    Repeats the last observed season. NaN rows have fewer than `season` points.
+    """
+    S, T = Y.shape
+    n = _valid_counts(Y)
+    point = np.full((S, horizon), np.nan)
+    sigma_h = np.full((S, horizon), np.nan)
+    if T < season:
+        return point, sigma_h
+
+    steps = np.arange(horizon)
+    point[:] = Y[:, T - season + steps % season]
+    diffs = Y[:, season:] - Y[:, :-season]
+    with np.errstate(invalid="ignore"):
+        diff_counts = (~np.isnan(diffs)).sum(axis=1)
+        sigma = np.where(diff_counts > 0, np.sqrt(np.nansum(diffs ** 2, axis=1) / np.maximum(diff_counts, 1)), 0.0)
+    sigma_h[:] = sigma[:, None] * np.sqrt(steps // season + 1)
+
+    too_short = n < season
+    point[too_short] = np.nan
+    sigma_h[too_short] = np.nan
+    return point, sigma_h
+
+def _holt_states(Y, cuts):
+    """
+    Runs Holt's linear exponential smoothing over Y once, for every (alpha, beta)
+    pair on the grid and every row at the same time (one time step per
+    iteration). Returns {cut: state} with the state after the first `cut`
+    columns, so all backtest origins share a single pass.
+    """
+    S, T = Y.shape
+    alpha = np.repeat(HOLT_ALPHAS, len(HOLT_BETAS))[:, None]  # (grid, 1)
+    beta = np.tile(HOLT_BETAS, len(HOLT_ALPHAS))[:, None]
+    level = np.zeros((len(alpha), S))
+    trend = np.zeros((len(alpha), S))
+    sse = np.zeros((len(alpha), S))
+    seen = np.zeros(S, dtype=int)
+    cuts = set(cuts)
+    states = {}
+
+    for t in range(T + 1):
+        if t in cuts:
+            states[t] = (level.copy(), trend.copy(), sse.copy(), seen.copy(), alpha, beta)
+        if t == T:
+            break
+        y = Y[:, t]
+        valid = ~np.isnan(y)
+        if not valid.any():
+            continue
+        # 1st point sets the level, 2nd the trend, later points are smoothed
+        smoothed = valid & (seen >= 2)
+        forecast = level + trend
+        new_level = alpha * y + (1 - alpha) * forecast
+        new_trend = beta * (new_level - level) + (1 - beta) * trend
+        if smoothed.all():
+            # Steady state once every row is past its first two points
+            sse += (y - forecast) ** 2
+            level, trend = new_level, new_trend
+        else:
+            sse += np.where(smoothed, (y - forecast) ** 2, 0.0)
+            trend = np.where(smoothed, new_trend, np.where(valid & (seen == 1), y - level, trend))
+            level = np.where(smoothed, new_level, np.where(valid & (seen < 2), y, level))
+        seen += valid
+    return states
+
+def _holt_forecast(state, horizon):
+    """
+    Forecast from a _holt_states state, using each row's grid pair with the
+    lowest in-sample one-step error. NaN rows have < 3 points.
+    """
+    level, trend, sse, seen, alpha, beta = state
+    S = level.shape[1]
+    best = sse.argmin(axis=0)
+    rows = np.arange(S)
+    a = alpha[best, 0][:, None]
+    b = beta[best, 0][:, None]
+    steps = np.arange(1, horizon + 1)
+    point = level[best, rows][:, None] + steps * trend[best, rows][:, None]
+
+    sigma = np.where(seen > 2, np.sqrt(sse[best, rows] / np.maximum(seen - 2, 1)), 0.0)
+    # Var(h) = sigma^2 * (1 + sum_{j<h} alpha^2 (1 + j beta)^2)
+    j = np.arange(horizon)
+    increments = np.where(j > 0, (a * (1 + j * b)) ** 2, 0.0)
+    sigma_h = sigma[:, None] * np.sqrt(1 + np.cumsum(increments, axis=1))
+
+    too_short = seen < 3
+    point[too_short] = np.nan
+    sigma_h[too_short] = np.nan
+    return point, sigma_h
+
+def _fit_holt(Y, horizon):
+    """
+    Holt's linear exponential smoothing, grid-searched per row.
+    """
+    T = Y.shape[1]
+    return _holt_forecast(_holt_states(Y, [T])[T], horizon)
+
+MODEL_FITS = {
+    "naive": _fit_naive,
+    "linear_trend": _fit_linear_trend,
+    "seasonal_naive": _fit_seasonal_naive,
+    "holt": _fit_holt,
+}
+
+def backtest(Y, origins=BACKTEST_ORIGINS, horizon=BACKTEST_HORIZON, holt_states=None):
+    """
+    Rolling-origin backtest: for each of the last `origins` months, fit every
+    model on the data before it and forecast up to `horizon` months ahead.
+    Returns {model: mean absolute error per row} (NaN where a model could
+    never be evaluated for a row). holt_states, if given, must cover every
+    origin (see _holt_states).
+    """
+    S, T = Y.shape
+    errors = {name: np.zeros(S) for name in MODELS}
+    counts = {name: np.zeros(S) for name in MODELS}
+    holdouts = range(1, min(origins, T - 2) + 1)
+    if holt_states is None:
+        holt_states = _holt_states(Y, [T - k for k in holdouts])  # One smoothing pass for all origins
+    for k in holdouts:
+        train = Y[:, :T - k]
+        steps = min(horizon, k)
+        actual = Y[:, T - k:T - k + steps]
+        # Origins need >= 2 training months per row, whatever the matrix width
+        enough_history = (_valid_counts(train) >= 2)[:, None]
+        for name, fit in MODEL_FITS.items():
+            if name == "holt":
+                point, _ = _holt_forecast(holt_states[T - k], steps)
+            else:
+                point, _ = fit(train, steps)
+            abs_error = np.abs(point - actual)
+            scored = ~np.isnan(abs_error) & enough_history
+            errors[name] += np.where(scored, abs_error, 0.0).sum(axis=1)
+            counts[name] += scored.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {name: np.where(counts[name] > 0, errors[name] / counts[name], np.nan) for name in MODELS}
+
+def forecast_matrix(Y, periods=FORECAST_MONTHS):
+    """
+    Forecasts every row of Y (series x months, right-aligned, NaN-padded).
+    Each row gets the model with the lowest backtest MAE; rows too short to
+    backtest fall back to the naive (latest month) forecast.
+    Returns dict with point/lower/upper (series x periods), model (index into
+    MODELS, -1 for empty rows) and backtest_mae {model: per-row MAE}.
     """
-    Generates a 6-month forecast for Revenue and Expenses using simple statistical growth.
+    Y = np.asarray(Y, dtype=float)
+    if Y.ndim == 1:
+        Y = Y[None, :]
+    S, T = Y.shape
+
+    # A single Holt pass serves the final fit and every backtest origin
+    holt_states = _holt_states(Y, [T - k for k in range(BACKTEST_ORIGINS + 1)])
+    fits = [
+        _holt_forecast(holt_states[T], periods) if name == "holt" else MODEL_FITS[name](Y, periods)
+        for name in MODELS
+    ]
+    points = np.stack([point for point, _ in fits])    # (model, series, periods)
+    sigmas = np.stack([sigma for _, sigma in fits])
+    maes = backtest(Y, holt_states=holt_states)
+
+    # Models that can't produce a forecast for a row are never selected
+    scores = np.stack([maes[name] for name in MODELS])
+    scores = np.where(np.isnan(points[:, :, 0]), np.inf, np.where(np.isnan(scores), np.inf, scores))
+    model = scores.argmin(axis=0)
+    no_score = np.isinf(scores).all(axis=0)
+    model[no_score] = MODELS.index("naive")
+    model[np.isnan(points[MODELS.index("naive"), :, 0])] = -1
+
+    rows = np.arange(S)
+    chosen = np.maximum(model, 0)
+    point = points[chosen, rows]
+    sigma = sigmas[chosen, rows]
+    return {
+        "point": point,
+        "lower": point - INTERVAL_Z * sigma,
+        "upper": point + INTERVAL_Z * sigma,
+        "model": model,
+        "backtest_mae": maes,
+    }
+
+def right_aligned(series_list):
+    """
+    Stacks 1-D sequences into a right-aligned, NaN-padded matrix.
+    """
+    width = max((len(values) for values in series_list), default=0)
+    Y = np.full((len(series_list), width), np.nan)
+    for row, values in enumerate(series_list):
+        if len(values):
+            Y[row, width - len(values):] = values
+    return Y
+
+def month_labels(last_date, periods=FORECAST_MONTHS):
+    """
+    "Mon YYYY" labels for the months after last_date.
+    """
+    return [(last_date + pd.DateOffset(months=i + 1)).strftime("%b %Y") for i in range(periods)]
+
+def format_forecast(labels, point, lower, upper):
+    """
+    One series' forecast (fitted in cents) as chart rows in units; amounts and
+    bounds are floored at 0 (no negative revenue/expenses).
+    """
+    columns = [np.round(np.maximum(0, values) / CENTS_PER_UNIT, 2).tolist() for values in (point, lower, upper)]
+    return [
+        {"date": label, "amount": p, "lower": lo, "upper": hi}
+        for label, p, lo, hi in zip(labels, *columns)
+    ]
+
+def model_summary(result, row):
+    """
+    Chosen model and per-model backtest MAE (in units) for one row of
+    forecast_matrix output.
+    """
+    return {
+        "model": MODELS[result["model"][row]],
+        "backtest_mae": {
+            name: None if np.isnan(mae[row]) else round(float(mae[row]) / CENTS_PER_UNIT, 2)
+            for name, mae in result["backtest_mae"].items()
+        }
+    }
+
+def generate_forecast(df, ledger=None):
+    """
+    Generates a 6-month forecast for Revenue and Expenses with 80% prediction
+    intervals. Naive, linear trend, seasonal naive and Holt smoothing are fitted
+    to each series and the one with the best rolling-origin backtest is used.
+    Reads the shared monthly aggregate from ledger (built from df if not given);
+    series are fitted in cents and converted to units in the output.
     """
     try:
-        # data preparation
-        # Coerce errors to NaT (Not a Time) prevents crash on "Monthly Agg."
-        df['date'] = pd.to_datetime(df['date'], errors='coerce') 
-        df = df.dropna(subset=['date']) # Drop rows with invalid dates
-        
-        if df.empty:
+        # data preparation (dates parsed and resampled to monthly once, in ledger.py)
+        if ledger is None:
+            ledger = prepare_ledger(df)
+        monthly = ledger.monthly
+        if monthly is None:
+            logger.warning("Forecasting Error: Missing 'date' column.")
+            return None
+
+        if monthly.empty:
              return {"revenue_forecast": [], "expense_forecast": []}
 
-        df = df.sort_values('date')
-        
-        # Resample to monthly to smooth out daily noise
-        monthly_data = df.set_index('date').resample('ME')['amount'].sum().reset_index()
-        
-        # Separate Revenue and Expenses
-        monthly_rev = df[df['amount'] > 0].set_index('date').resample('ME')['amount'].sum().reset_index()
-        monthly_exp = df[df['amount'] < 0].set_index('date').resample('ME')['amount'].sum().abs().reset_index() # Use abs for training
-        
-        # Helper to predict (Simple Version)
-        def predict_series(series_df, periods=6):
-            if len(series_df) < 2:
-                return [] 
-            
-            # Simple Average Growth
-            # If we have 2 months: 100, 110. Growth = 10%.
-            # Render Free Tier often crashes with Scikit-Learn.
-            
-            current_val = series_df['amount'].iloc[-1]
-            avg_val = series_df['amount'].mean()
-            
-            # Simple projection: oscillate around average with slight growth
-            growth_factor = 1.02 # Assumed 2% growth
-            
-            last_date = series_df['date'].max()
-            future_dates = [last_date + pd.DateOffset(months=i+1) for i in range(periods)]
-            
-            predictions = []
-            param_val = current_val
-            for _ in future_dates:
-                param_val = param_val * growth_factor
-                predictions.append(param_val)
-
-            return [
-                {"date": d.strftime("%b %Y"), "amount": round(max(0, float(pred)), 2)} 
-                for d, pred in zip(future_dates, predictions)
-            ]
-
-        forecast_rev = predict_series(monthly_rev)
-        forecast_exp = predict_series(monthly_exp)
-        
+        # Separate Revenue and Expenses, each trimmed to the months it has rows in
+        monthly_rev = ledger.active_months('revenue')
+        monthly_exp = ledger.active_months('expenses') # abs values for training
+
+        series = [monthly_rev, monthly_exp]
+        result = forecast_matrix(right_aligned([s['amount_cents'].to_numpy(dtype=float) for s in series]))
+
+        forecasts = []
+        models = []
+        for row, series_df in enumerate(series):
+            if len(series_df) < 2 or result["model"][row] < 0:
+                forecasts.append([])
+                models.append(None)
+                continue
+            forecasts.append(format_forecast(
+                month_labels(series_df['date'].max()), result["point"][row], result["lower"][row], result["upper"][row]
+            ))
+            models.append(model_summary(result, row))
+
         return {
-            "revenue_forecast": forecast_rev,
-            "expense_forecast": forecast_exp
+            "revenue_forecast": forecasts[0],
+            "expense_forecast": forecasts[1],
+            "models": {"revenue": models[0], "expenses": models[1]}
         }
 
     except Exception as e:
-        print(f"Forecasting Error: {e}")
+        logger.error("Forecasting Error: %s", e)
         return None
+
+def monthly_by_company(df):
+    """
+    Long-format transactions (company_id, date, amount) -> one groupby-resample
+    into dense company x month matrices: revenue and expense cents and the row
+    counts behind each (gap months are 0). Returns (company_ids, first_month,
+    arrays); first_month is a pandas Period, arrays maps name -> (companies, months).
+    """
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    amount_cents = to_cents(df['amount'])
+    dated = dates.notna().to_numpy()
+    amounts = amount_cents[dated]
+    # Summed in int cents, like ledger.monthly_aggregate, so a company's series
+    # here is bit-identical to the one its single-company forecast sees
+    parts = pd.DataFrame({
+        'company_id': df['company_id'][dated].to_numpy(),
+        'date': dates[dated].to_numpy(),
+        'revenue_cents': np.where(amounts > 0, amounts, 0),
+        'expense_cents': np.where(amounts < 0, -amounts, 0),
+        'revenue_rows': (amounts > 0).astype('int64'),
+        'expense_rows': (amounts < 0).astype('int64'),
+    })
+    monthly = parts.groupby(['company_id', pd.Grouper(key='date', freq='ME')]).sum()
+
+    company_codes, company_ids = pd.factorize(monthly.index.get_level_values(0))
+    months = monthly.index.get_level_values(1).to_period('M')
+    month_numbers = months.year * 12 + months.month - 1
+    first = month_numbers.min() if len(months) else 0
+    width = (month_numbers.max() - first + 1) if len(months) else 0
+    month_codes = np.asarray(month_numbers - first)
+
+    arrays = {}
+    for column in ('revenue_cents', 'expense_cents', 'revenue_rows', 'expense_rows'):
+        matrix = np.zeros((len(company_ids), width))
+        matrix[company_codes, month_codes] = monthly[column].to_numpy(dtype=float)
+        arrays[column] = matrix
+    first_month = pd.Period(year=first // 12, month=first % 12 + 1, freq='M')
+    return company_ids, first_month, arrays
+
+def align_active(values, rows):
+    """
+    Trims each row of a company x month matrix to its first..last month with
+    rows > 0 (like Ledger.active_months) and right-aligns it, NaN-padded.
+    Returns (Y, last_month_index, active_length).
+    """
+    S, W = values.shape
+    active = rows > 0
+    has_any = active.any(axis=1)
+    first = active.argmax(axis=1)
+    last = W - 1 - active[:, ::-1].argmax(axis=1)
+    # Column j of the output reads column j - (W - 1 - last) of the input
+    source = np.arange(W)[None, :] - (W - 1 - last)[:, None]
+    keep = has_any[:, None] & (source >= first[:, None])
+    Y = np.where(keep, values[np.arange(S)[:, None], np.clip(source, 0, W - 1)], np.nan)
+    length = np.where(has_any, last - first + 1, 0)
+    return Y, last, length
+
+def forecast_batch(df, periods=FORECAST_MONTHS):
+    """
+    Forecasts revenue and expenses for every company in a long-format frame
+    (company_id, date, amount) in one pass: a single groupby-resample builds
+    the monthly matrices and forecast_matrix fits all companies' series
+    together. Same models, selection and output per company as generate_forecast.
+    """
+    company_ids, first_month, arrays = monthly_by_company(df)
+    if len(company_ids) == 0:
+        return []
+
+    rev, rev_last, rev_len = align_active(arrays['revenue_cents'], arrays['revenue_rows'])
+    exp, exp_last, exp_len = align_active(arrays['expense_cents'], arrays['expense_rows'])
+    n = len(company_ids)
+    result = forecast_matrix(np.vstack([rev, exp]), periods)  # Rows: every company's revenue, then expenses
+
+    # Labels for every month a forecast can start after, computed once
+    calendar = pd.period_range(first_month + 1, periods=arrays['revenue_cents'].shape[1] + periods, freq='M').strftime("%b %Y").tolist()
+    lasts = np.concatenate([rev_last, exp_last])
+    lengths = np.concatenate([rev_len, exp_len])
+
+    forecasts = []
+    for i, company_id in enumerate(company_ids.tolist()):
+        entry = {"company_id": company_id, "models": {}}
+        for key, model_key, row in (("revenue_forecast", "revenue", i), ("expense_forecast", "expenses", n + i)):
+            if lengths[row] < 2 or result["model"][row] < 0:
+                entry[key] = []
+                entry["models"][model_key] = None
+                continue
+            labels = calendar[lasts[row]:lasts[row] + periods]
+            entry[key] = format_forecast(labels, result["point"][row], result["lower"][row], result["upper"][row])
+            entry["models"][model_key] = model_summary(result, row)
+        forecasts.append(entry)
+    return forecasts
@@ -1,62 +1,70 @@
-import json
+import io
+from array import array
+import ijson
+import numpy as np
 import pandas as pd
+from transactions import compact_transactions
+from log_utils import get_logger
 
-def parse_gstr1(file_bytes):
+logger = get_logger("gst_parser")
+
+# ijson item prefixes for the two GSTR-1 sections we read
+B2B_INVOICES = 'b2b.item.inv.item'      # data['b2b'][*]['inv'][*]
+B2CS_ENTRIES = 'b2cs.item'              # data['b2cs'][*]
+
+def parse_gstr1(source):
     """
     Parses a GSTR-1 JSON file and returns a DataFrame of B2B invoices.
     Also calculates total turnover from the payload.
+    Accepts bytes or a seekable binary file object. Each section is streamed with
+    ijson (one invoice in memory at a time) into columnar arrays, instead of
+    json.loads building the whole document.
     """
     try:
-        data = json.loads(file_bytes.decode('utf-8'))
-        
-        # Helper to extract invoices
+        stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
         # GSTR-1 Structure roughly: data['b2b'] -> list of invoices
-        
-        invoices = []
-        
+        b2b_dates = []
+        b2b_numbers = []
+        b2b_amounts = array('d')
+        b2cs_amounts = array('d')
+
         # 1. B2B Invoices (Business to Business)
-        if 'b2b' in data:
-            for entry in data['b2b']:
-                for inv in entry.get('inv', []):
-                    # inv['idt'] = Invoice Date
-                    # inv['val'] = Total Invoice Value
-                    invoices.append({
-                        'date': inv.get('idt', 'Unknown'),
-                        'description': f"GST Inv#{inv.get('inum', 'NA')} (B2B)",
-                        'amount': float(inv.get('val', 0)),
-                        'category': 'Revenue' # Verified Revenue
-                    })
-                    
+        stream.seek(0)
+        for inv in ijson.items(stream, B2B_INVOICES, use_float=True):
+            # inv['idt'] = Invoice Date
+            # inv['val'] = Total Invoice Value
+            b2b_dates.append(inv.get('idt', 'Unknown'))
+            b2b_numbers.append(inv.get('inum', 'NA'))
+            b2b_amounts.append(float(inv.get('val', 0)))
+
         # 2. B2CS (Business to Consumer Small) - usually aggregated
-        if 'b2cs' in data:
-             for entry in data['b2cs']:
-                 # entry['txval'] = Taxable Value
-                 invoices.append({
-                     'date': 'Monthly Agg.',
-                     'description': "GST B2CS Aggregated Sales",
-                     'amount': float(entry.get('txval', 0)),
-                     'category': 'Revenue'
-                 })
-
-        if not invoices:
+        stream.seek(0)
+        for entry in ijson.items(stream, B2CS_ENTRIES, use_float=True):
+            # entry['txval'] = Taxable Value
+            b2cs_amounts.append(float(entry.get('txval', 0)))
+
+        if not b2b_amounts and not b2cs_amounts:
             # Fallback for mock data if structure is different
-            print("GST Parser: No standard invoice keys found. Returning empty.")
+            logger.info("GST Parser: No standard invoice keys found. Returning empty.")
             return pd.DataFrame()
 
-        df = pd.DataFrame(invoices)
-        df['amount'] = pd.to_numeric(df['amount'])
-        
-        # Sort by date if possible (dd-mm-yyyy format usually in GST)
+        b2cs_count = len(b2cs_amounts)
+        df = pd.DataFrame({
+            'date': b2b_dates + ['Monthly Agg.'] * b2cs_count,
+            'description': [f"GST Inv#{num} (B2B)" for num in b2b_numbers] + ["GST B2CS Aggregated Sales"] * b2cs_count,
+            'amount': np.concatenate([np.frombuffer(b2b_amounts), np.frombuffer(b2cs_amounts)]),
+            'category': 'Revenue' # Verified Revenue
+        })
+
+        # Parse dates once (dd-mm-yyyy format usually in GST); kept as datetime64 for downstream stages
         try:
-            # Normalize to datetime first to ensure validity
-            df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y', errors='coerce').fillna(pd.Timestamp.now())
-            # Convert back to string for JSON serialization
-            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+            df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y', errors='coerce').fillna(pd.Timestamp.now().normalize())
         except:
             df['date'] = df['date'].astype(str)
-            
-        return df
+
+        return compact_transactions(df)
 
     except Exception as e:
-        print(f"GST Parsing Error: {e}")
+        logger.error("GST Parsing Error: %s", e)
         return pd.DataFrame()
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+from sqlalchemy import select, func
+
+from database import FinancialReport
+from crypto_utils import decrypt_columns
+
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "1000"))  # Companies kept decrypted in memory
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "30"))     # Seconds before re-checking the DB for new reports
+ENCRYPTED_FIELDS = ["revenue", "expenses", "net_profit"]
+
+class HistoryCache:
+    """
+    Decrypted report history per company. A cached history is served without
+    touching the database until it is invalidated (a new report was saved in
+    this process) or HISTORY_CACHE_TTL passes (covers other workers' writes).
+    A refresh fetches and decrypts only the reports newer than the last cached
+    one; the full history is reloaded only if the row count says one was missed.
+    """
+
+    def __init__(self, max_entries=HISTORY_CACHE_SIZE, ttl_seconds=HISTORY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.refreshes = 0
+        self.rows_decrypted = 0
+        self._entries = {}  # company_id -> {"points", "last_id", "checked_at", "stale"}
+        self._lock = threading.Lock()
+
+    def invalidate(self, company_id):
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry is not None:
+                entry["stale"] = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, db, company_id):
+        """
+        Returns the company's history points, oldest first.
+        """
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry is not None and not entry["stale"] and time.time() - entry["checked_at"] < self.ttl_seconds:
+                self.hits += 1
+                return entry["points"]
+            if entry is not None:
+                entry["stale"] = False  # A concurrent invalidate() during the refresh sets it again
+            points = entry["points"] if entry is not None else []
+            last_id = entry["last_id"] if entry is not None else 0
+
+        checked_at = time.time()
+        new_points = self._load(db, company_id, last_id)
+        if len(points) + len(new_points) != self._count(db, company_id):
+            # A report with a lower id committed after our last refresh (or rows were deleted): reload
+            points, new_points = [], self._load(db, company_id, 0)
+
+        with self._lock:
+            self.refreshes += 1
+            self.rows_decrypted += len(new_points)
+            entry = self._entries.pop(company_id, None)
+            points = sorted(points + new_points, key=lambda p: (p["date"], p["report_id"]))
+            self._entries[company_id] = {
+                "points": points,
+                "last_id": max([p["report_id"] for p in points], default=0),
+                "checked_at": checked_at,
+                "stale": entry["stale"] if entry is not None else False,
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))  # Least recently refreshed company
+            return points
+
+    def stats(self):
+        with self._lock:
+            return {
+                "companies": len(self._entries),
+                "hits": self.hits,
+                "refreshes": self.refreshes,
+                "rows_decrypted": self.rows_decrypted,
+            }
+
+    @staticmethod
+    def _count(db, company_id):
+        reports = FinancialReport.__table__.c
+        return db.execute(select(func.count()).where(reports.company_id == company_id)).scalar()
+
+    @staticmethod
+    def _load(db, company_id, after_id):
+        """
+        Reports of company_id with id > after_id, decrypted in one batch.
+        """
+        reports = FinancialReport.__table__.c
+        stmt = (
+            select(reports.id, reports.report_date, reports.upload_filename, reports.health_score,
+                   reports.revenue, reports.expenses, reports.net_profit)
+            .where(reports.company_id == company_id, reports.id > after_id)
+            .order_by(reports.report_date, reports.id)
+        )
+        rows = [dict(row._mapping) for row in db.execute(stmt)]
+        decrypt_columns(rows, ENCRYPTED_FIELDS, float)
+        return [
+            {
+                "report_id": row["id"],
+                "date": row["report_date"],
+                "filename": row["upload_filename"],
+                "revenue": row["revenue"],
+                "expenses": row["expenses"],
+                "net_profit": row["net_profit"],
+                "health_score": row["health_score"],
+            }
+            for row in rows
+        ]
+
+history_cache = HistoryCache()
+
+def company_history(db, company):
+    """
+    Report history of a company as time series (one entry per upload, oldest
+    first) ready for charting.
+    """
+    points = history_cache.get(db, company.id)
+    return {
+        "company_id": company.id,
+        "company_name": company.name,
+        "industry": company.industry,
+        "reports": len(points),
+        "history": [dict(point, date=point["date"].isoformat() if point["date"] else None) for point in points],
+    }
@@ -0,0 +1,276 @@
+import asyncio
+import datetime
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from log_utils import get_logger
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.db")
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", "job_uploads")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Analyses running at once
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "20"))  # Waiting jobs before submissions are rejected
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # A running job's claim lapses this long after its last heartbeat
+
+logger = get_logger("jobs")
+
+class QueueFullError(Exception):
+    pass
+
+class JobStore:
+    """
+    Job status store on a local SQLite file (stdlib sqlite3, no external service),
+    so job state and stage results survive a worker restart. The file is shared
+    by every worker process on the host: a job runs in the process that claims
+    it, which holds a lease (owner, lease_until) renewed by heartbeats.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    upload_path TEXT,
+                    stages TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    owner TEXT,
+                    lease_until REAL
+                )
+            """)
+            # Job stores created before leases existed
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, type_ in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {type_}")
+
+    def create(self, job_id, params, upload_path):
+        now = datetime.datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, upload_path, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(params), upload_path, now, now)
+            )
+
+    def update(self, job_id, status, result=None, error=None, owner=None):
+        """
+        Sets a job's final status and releases its lease. With owner, only
+        while that owner still holds the job. Returns whether a row changed.
+        """
+        now = datetime.datetime.utcnow().isoformat()
+        result_json = json.dumps(result, default=str) if result is not None else None
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, owner = NULL, lease_until = NULL WHERE id = ?"
+        params = (status, result_json, error, now, job_id)
+        if owner is not None:
+            query += " AND owner = ?"
+            params += (owner,)
+        with self._lock, self._conn:
+            return self._conn.execute(query, params).rowcount == 1
+
+    def claim(self, job_id, owner, lease_seconds=JOB_LEASE_SECONDS):
+        """
+        Atomically moves a queued job to running under owner's lease. False when
+        another worker already claimed it (or it is no longer queued).
+        """
+        now = datetime.datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, stages = '{}', updated_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (owner, time.time() + lease_seconds, now, job_id)
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id, owner, lease_seconds=JOB_LEASE_SECONDS):
+        """
+        Extends owner's lease on a running job. False when the lease was lost.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, owner)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, owner):
+        """
+        Re-queues the running jobs owner holds, e.g. on a clean shutdown, so the
+        next worker need not wait for their leases to lapse.
+        """
+        now = datetime.datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL, stages = '{}', updated_at = ? "
+                "WHERE status = 'running' AND owner = ?",
+                (now, owner)
+            )
+
+    def requeue_expired(self):
+        """
+        Puts running jobs whose lease has lapsed (their worker died) back to
+        queued. Returns the ids of every queued job, oldest first.
+        """
+        now = datetime.datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL, stages = '{}', updated_at = ? "
+                "WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)",
+                (now, time.time())
+            )
+            rows = self._conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [row["id"] for row in rows]
+
+    def record_stage(self, job_id, name, ms, result=None):
+        now = datetime.datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row["stages"])
+            stages[name] = {"ms": ms, "result": result}
+            self._conn.execute(
+                "UPDATE jobs SET stages = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(stages, default=str), now, job_id)
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "params": json.loads(row["params"]),
+            "upload_path": row["upload_path"],
+            "stages": json.loads(row["stages"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+class JobQueue:
+    """
+    Local worker pool for background analyses: at most `workers` jobs run at once
+    and at most `max_queued` wait; beyond that submit() raises QueueFullError.
+    runner(job, on_stage) is an async callable returning the job result.
+    Each process is one owner: it only runs jobs it claims in the store, and
+    every lease_seconds it re-queues jobs whose owner stopped heartbeating.
+    """
+
+    def __init__(self, store, runner, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, lease_seconds=JOB_LEASE_SECONDS):
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue = asyncio.Queue()
+        self._queued = set()  # Job ids in _queue, so recovery doesn't queue one twice
+        self._tasks = []
+
+    @property
+    def waiting(self):
+        return self._queue.qsize()
+
+    def submit(self, job_id):
+        if self._queue.qsize() >= self.max_queued:
+            raise QueueFullError(f"Job queue is full ({self.max_queued} waiting).")
+        self._queue.put_nowait(job_id)
+        self._queued.add(job_id)
+
+    async def start(self):
+        await self._recover()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def _recover(self):
+        """
+        Queues jobs left queued, or running under a lapsed lease, by this or
+        another worker process. Jobs a live sibling is running keep their lease;
+        a queued job picked up by several processes is run by whichever claims it.
+        """
+        for job_id in await asyncio.to_thread(self.store.requeue_expired):
+            if job_id not in self._queued:
+                logger.info("Recovering job %s", job_id)
+                self._queue.put_nowait(job_id)
+                self._queued.add(job_id)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds)
+            try:
+                await self._recover()
+            except Exception as e:
+                logger.error("Job recovery error: %s", e)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self.store.release, self.owner)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.store.heartbeat, job_id, self.owner, self.lease_seconds):
+                logger.warning("Lost the lease on job %s", job_id)
+                return
+
+    async def _run(self, job_id):
+        if not await asyncio.to_thread(self.store.claim, job_id, self.owner, self.lease_seconds):
+            return  # Claimed by another worker, or no longer queued
+        job = await asyncio.to_thread(self.store.get, job_id)
+
+        # Stage writes go to a thread (sqlite3 commits block); all land before the final status
+        stage_writes = []
+
+        def on_stage(name, ms, result=None):
+            stage_writes.append(asyncio.ensure_future(
+                asyncio.to_thread(self.store.record_stage, job_id, name, ms, result)
+            ))
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result = await self.runner(job, on_stage)
+            status, error = "done", None
+        except asyncio.CancelledError:
+            # Worker shutdown: stop() hands the job back to the queue (or its lease lapses)
+            raise
+        except Exception as e:
+            result = None
+            detail = getattr(e, "detail", None) or str(e)
+            logger.error("JOB ERROR (%s): %s", job_id, detail)
+            status, error = "failed", str(detail)
+        finally:
+            heartbeat.cancel()
+        await asyncio.gather(*stage_writes, return_exceptions=True)
+        await asyncio.to_thread(self.store.update, job_id, status, result=result, error=error, owner=self.owner)
+
+        upload_path = job.get("upload_path")
+        if upload_path and os.path.exists(upload_path):
+            os.remove(upload_path)
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from money import frame_cents
+from transactions import compact_transactions, concat_transactions
+
+class Ledger:
+    """
+    One upload's transactions, prepared once per request and shared by the
+    forecasting, bookkeeping and working capital stages.
+    - frame: the transactions with dates parsed to datetime64, in upload order
+      (not a sorted copy; newest() picks the latest rows)
+    - monthly: month-end indexed revenue/expense sums (int cents) and row counts (None without dates)
+    """
+    def __init__(self, frame, monthly):
+        self.frame = frame
+        self.monthly = monthly
+
+    def newest(self, n):
+        """
+        The n newest dated rows, newest first. Rows with the same date keep their
+        upload order, as in a stable descending sort; undated rows are never included.
+        """
+        return self.frame.iloc[self.newest_positions(n)]
+
+    def newest_positions(self, n):
+        """
+        Row positions of newest(n).
+        """
+        ticks = self.frame['date'].array.asi8
+        undated = np.iinfo(np.int64).max
+        key = np.where(ticks == np.iinfo(np.int64).min, undated, -ticks)  # NaT is the minimum int64
+        if len(key) > n:
+            # Only the rows at or above the n-th smallest key need sorting
+            kth = np.partition(key, n - 1)[n - 1]
+            candidates = np.flatnonzero(key <= kth)
+            order = candidates[np.argsort(key[candidates], kind='stable')][:n]
+        else:
+            order = np.argsort(key, kind='stable')
+        return order[key[order] != undated]
+
+    def active_months(self, column):
+        """
+        Monthly 'revenue' or 'expenses' trimmed to the first..last month that has
+        such rows (gap months inside stay as 0), as a date/amount_cents DataFrame.
+        """
+        cents_col, rows_col = ('revenue_cents', 'revenue_rows') if column == 'revenue' else ('expense_cents', 'expense_rows')
+        active = self.monthly.index[self.monthly[rows_col] > 0]
+        if active.empty:
+            return pd.DataFrame(columns=['date', 'amount_cents'])
+        series = self.monthly.loc[active.min():active.max(), cents_col]
+        return series.rename('amount_cents').rename_axis('date').reset_index()
+
+TRANSACTION_KEY = ['date', 'description', 'amount']
+
+def merge_transactions(frames):
+    """
+    Combines per-file transaction frames (e.g. a batch of monthly statements) and
+    drops rows repeated across files, such as overlapping statement periods.
+    Repeats inside a single file are kept: the n-th occurrence of a
+    (date, description, amount) key in one file only matches the n-th in another.
+    """
+    parts = []
+    for df in frames:
+        part = pd.DataFrame({
+            'date': pd.to_datetime(df['date'], errors='coerce') if 'date' in df.columns else pd.NaT,
+            'description': df['description'] if 'description' in df.columns else None,
+            'amount': pd.to_numeric(df['amount'], errors='coerce').fillna(0)
+        }, index=df.index)
+        part['occurrence'] = part.groupby(TRANSACTION_KEY, dropna=False, sort=False).cumcount()
+        parts.append(part)
+
+    merged = concat_transactions(parts)
+    merged = merged.drop_duplicates(subset=TRANSACTION_KEY + ['occurrence'])
+    return compact_transactions(merged.drop(columns='occurrence').reset_index(drop=True))
+
+def prepare_ledger(df):
+    """
+    Parses the 'date' column a single time and builds the monthly aggregate.
+    Frames whose dates are already datetime64 (compact frames) are used as they are.
+    """
+    if 'date' not in df.columns:
+        return Ledger(df, None)
+
+    if not pd.api.types.is_datetime64_any_dtype(df['date']):
+        # Coerce errors to NaT (Not a Time) prevents crash on "Monthly Agg."
+        df = df.assign(date=pd.to_datetime(df['date'], errors='coerce'))
+    return Ledger(df, monthly_aggregate(df))
+
+def monthly_aggregate(frame):
+    """
+    Revenue (amount > 0), expenses (abs of amount < 0) and how many rows fed each,
+    per calendar month (month-end index, empty months as 0), so callers can trim
+    a series to its active months. Naive dates are bucketed with np.bincount
+    over month numbers, without building a per-row frame.
+    Sums are int64 cents (exact in bincount's float64 up to 2**53 cents), so
+    they don't depend on row order.
+    """
+    dates = frame['date']
+    amount_cents = frame_cents(frame)
+    if getattr(dates.dtype, 'tz', None) is None:
+        ticks = dates.to_numpy()
+        dated = ~np.isnat(ticks)
+        amounts = amount_cents[dated]
+        months = ticks[dated].astype('datetime64[M]').astype(np.int64)
+        if len(months):
+            first = months.min()
+            offsets = months - first
+            size = int(offsets.max()) + 1
+            is_revenue = amounts > 0
+            is_expense = amounts < 0
+            monthly = pd.DataFrame({
+                'revenue_cents': np.bincount(offsets, weights=np.where(is_revenue, amounts, 0), minlength=size).astype('int64'),
+                'expense_cents': np.bincount(offsets, weights=np.where(is_expense, -amounts, 0), minlength=size).astype('int64'),
+                'revenue_rows': np.bincount(offsets, weights=is_revenue, minlength=size).astype('int64'),
+                'expense_rows': np.bincount(offsets, weights=is_expense, minlength=size).astype('int64')
+            }, index=pd.date_range(pd.Timestamp(np.datetime64(int(first), 'M')), periods=size, freq='ME',
+                                   unit=np.datetime_data(ticks.dtype)[0], name='date'))
+            return monthly
+
+    dated = frame['date'].notna().to_numpy()
+    amounts = amount_cents[dated]
+    is_revenue = amounts > 0
+    is_expense = amounts < 0
+    parts = pd.DataFrame({
+        'revenue_cents': np.where(is_revenue, amounts, 0),
+        'expense_cents': np.where(is_expense, -amounts, 0),
+        'revenue_rows': is_revenue.astype('int64'),
+        'expense_rows': is_expense.astype('int64')
+    }, index=frame['date'][dated])
+    return parts.sort_index().resample('ME').sum()
@@ -0,0 +1,139 @@
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from log_utils import get_logger
+
+logger = get_logger("llm_cache")
+
+def make_cache_key(financial_summary, language, model, prompt_version):
+    """
+    Canonical content hash of everything that determines an LLM analysis.
+    Key order and whitespace in the summary do not change the hash.
+    """
+    payload = json.dumps(
+        {
+            "summary": financial_summary,
+            "language": language,
+            "model": model,
+            "prompt_version": prompt_version
+        },
+        sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class AnalysisCache:
+    """
+    Two-tier cache for LLM analyses: an in-memory LRU in front of an optional
+    persistent table (database.LLMCacheEntry). Entries expire after ttl_seconds.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=86400, session_factory=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.session_factory = session_factory  # None = memory tier only
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+
+        entry = self._db_get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+        # Promoted with the row's own age, so it expires from memory when it would have in the table
+        stored_at, value = entry
+        self._memory_set(key, value, stored_at)
+        return value
+
+    def set(self, key, value):
+        self._memory_set(key, value, time.time())
+        self._db_set(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self.session_factory is not None,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _memory_set(self, key, value, stored_at):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _db_get(self, key):
+        """
+        (stored_at, value) of a live row, stored_at as a time.time() timestamp; else None.
+        """
+        if self.session_factory is None:
+            return None
+        from database import LLMCacheEntry
+        db = self.session_factory()
+        try:
+            row = db.get(LLMCacheEntry, key)
+            if row is None:
+                return None
+            age = (datetime.datetime.utcnow() - row.created_at).total_seconds()
+            if age > self.ttl_seconds:
+                db.delete(row)
+                db.commit()
+                with self._lock:
+                    self.evictions += 1
+                return None
+            return time.time() - age, row.response_text
+        except Exception as e:
+            logger.warning("LLM Cache Read Error: %s", e)
+            return None
+        finally:
+            db.close()
+
+    def _db_set(self, key, value):
+        if self.session_factory is None:
+            return
+        from database import LLMCacheEntry
+        db = self.session_factory()
+        try:
+            db.merge(LLMCacheEntry(cache_key=key, response_text=value, created_at=datetime.datetime.utcnow()))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("LLM Cache Write Error: %s", e)
+        finally:
+            db.close()
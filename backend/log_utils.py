@@ -0,0 +1,64 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG also logs raw LLM responses, bank data and span tags
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records waiting for the writer thread before new ones are dropped
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks the caller: when the writer thread falls
+    behind and the queue is full, the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_handler = None
+_listener = None
+
+def _configure():
+    """
+    Routes the app's loggers through one bounded queue; a background thread
+    formats the records and writes them to stdout.
+    """
+    global _handler, _listener
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _handler = DroppingQueueHandler(log_queue)
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    root = logging.getLogger("finhealth")
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_handler)
+    root.propagate = False
+
+def get_logger(name):
+    if _handler is None:
+        _configure()
+    return logging.getLogger(f"finhealth.{name}")
+
+def stop_logging():
+    """
+    Writes out whatever is still queued (registered to run at exit).
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
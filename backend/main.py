@@ -1,27 +1,64 @@
-from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 import pandas as pd
+import asyncio
+import datetime
+import time
+import uuid
+import shutil
 import io
 import io
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
-from openai import OpenAI
-from database import SessionLocal, Company, FinancialReport, ComplianceLog
-from forecasting import generate_forecast
-from bookkeeping import auto_categorize
+from openai import AsyncOpenAI
+from database import SessionLocal, Company, engine, init_db, pool_status, DB_CREATE_SCHEMA
+from forecasting import generate_forecast, forecast_batch
+from bookkeeping import auto_categorize, bookkeeping_response
 from tax import calculate_tax
 from working_capital import analyze_working_capital
-from reports import generate_pdf_report
+from ledger import prepare_ledger, merge_transactions
+from pipeline import Pipeline
+from jobs import JobStore, JobQueue, QueueFullError, JOB_SPOOL_DIR
+from persistence import AnalysisRecord, save_records, WriteBehindBuffer, WRITE_BEHIND, company_ids
+from reports import render_report, render_reports, stored_report_payloads, stream_zip, report_filename, report_cache
 from fastapi import Response, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse
 from pdf_parser import parse_pdf
 from gst_parser import parse_gstr1
 from banking_mock import get_mock_bank_data
+from llm_cache import AnalysisCache, make_cache_key
+from csv_stream import read_csv_stream, aggregate_csv_stream, COLUMN_MAP
+from compliance import query_logs, export_ndjson, export_csv, MAX_PAGE_SIZE
+from history import company_history, history_cache
+from aggregates import append_transactions
+from money import frame_cents, split_totals, units
+from log_utils import get_logger, dropped_records
+from profiling import ProfilingMiddleware, profile_store, token_matches
+from metrics import span, record_span, render as render_metrics, sample_family, LLM_SECONDS, LLM_TOKENS, UPLOAD_ROWS, UPLOAD_BYTES, UPLOAD_PAGES
+
+@asynccontextmanager
+async def lifespan(app):
+    if DB_CREATE_SCHEMA:
+        try:
+            await asyncio.to_thread(init_db)  # Once per worker at startup, not on import
+        except Exception as e:
+            logger.error("DB SCHEMA INIT ERROR: %s", e)
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    if write_behind is not None:
+        write_behind.close()  # Clean flush of buffered analyses
+    engine.dispose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+logger = get_logger("api")
 
 # Enable CORS for React Frontend
 app.add_middleware(
@@ -30,8 +67,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Lets browser clients read the compliance log cursor
 )
 
+# Opt-in request profiling (X-Profile header or PROFILE_SAMPLE_RATE); see profiling.py
+app.add_middleware(ProfilingMiddleware)
+
 @app.get("/health")
 def health_check():
     return {"status": "online", "version": "1.0.1", "message": "Backend is running!"}
@@ -47,20 +88,47 @@ def get_db():
         db.close()
 
 # Initialize OpenAI (Using OpenRouter for Free Tier)
-# Initialize OpenAI (Using OpenRouter for Free Tier)
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
+# Async client so a slow model round trip never blocks the event loop.
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # Seconds per analysis, retries included
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # In-flight LLM calls per worker
+
+client = AsyncOpenAI(
+    base_url=LLM_BASE_URL,
     api_key=os.getenv("OPENROUTER_API_KEY"),
+    timeout=LLM_TIMEOUT,
     default_headers={
         "HTTP-Referer": "http://localhost:5173", # Optional: For OpenRouter rankings
         "X-Title": "SME Financial Health Platform", # Optional: For OpenRouter rankings
     }
 )
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
 
-def analyze_with_llm(financial_summary, language="English"):
+LLM_MODEL = os.getenv("LLM_MODEL", "openai/gpt-oss-120b") # Reliable free model
+PROMPT_VERSION = "1" # Bump whenever the prompt below changes to invalidate cached analyses
+
+# Identical (summary, language, model, prompt) -> cached analysis, zero tokens
+analysis_cache = AnalysisCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "256")),
+    ttl_seconds=int(os.getenv("LLM_CACHE_TTL", "86400")),
+    session_factory=SessionLocal if os.getenv("LLM_CACHE_PERSIST", "false").lower() == "true" else None
+)
+
+async def analyze_with_llm(financial_summary, language="English"):
     """
     Sends the calculated metrics to OpenAI for detailed, structured analysis.
+    At most LLM_MAX_CONCURRENCY calls are in flight; each is bounded by LLM_TIMEOUT,
+    including the wait for a free slot.
+    Successful analyses are served from analysis_cache on repeat.
     """
+    start = time.perf_counter()
+    cache_key = make_cache_key(financial_summary, language, LLM_MODEL, PROMPT_VERSION)
+    cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+    if cached is not None:
+        logger.info("LLM Cache Hit.")
+        LLM_SECONDS.observe(time.perf_counter() - start, "cache")
+        return cached
+
     prompt = f"""
     You are a high-level Virtual CFO for an SME. 
     Analyze the following financial data:
@@ -80,16 +148,22 @@ def analyze_with_llm(financial_summary, language="English"):
     """
     
     try:
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-120b", # Reliable free model
-            messages=[
-                {"role": "system", "content": "You are a helpful financial expert assistant that outputs valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
+        # The timeout covers waiting for a concurrency slot as well as the call itself
+        async with asyncio.timeout(LLM_TIMEOUT), llm_semaphore:
+            response = await client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are a helpful financial expert assistant that outputs valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
         content = response.choices[0].message.content
-        print(f"RAW LLM RESPONSE:\n{content}\n----------------")
+        logger.debug("RAW LLM RESPONSE:\n%s\n----------------", content)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            LLM_TOKENS.observe(usage.prompt_tokens or 0, "prompt")
+            LLM_TOKENS.observe(usage.completion_tokens or 0, "completion")
         
         # Cleanup
         content = content.replace("```json", "").replace("```", "").strip()
@@ -105,11 +179,18 @@ def analyze_with_llm(financial_summary, language="English"):
                 "recommended_products": []
              }
              content = json.dumps(data)
+             LLM_SECONDS.observe(time.perf_counter() - start, "fallback")
+        else:
+             await asyncio.to_thread(analysis_cache.set, cache_key, content)
+             LLM_SECONDS.observe(time.perf_counter() - start, "ok")
 
         return content
 
     except Exception as e:
-        print(f"LLM EXCEPTION: {e}")
+        if isinstance(e, asyncio.TimeoutError):
+            e = TimeoutError(f"LLM request timed out after {LLM_TIMEOUT}s")
+        logger.error("LLM EXCEPTION: %s", e)
+        LLM_SECONDS.observe(time.perf_counter() - start, "error")
         
         error_msg = "Could not generate risk assessment due to AI service disruption."
         summary_msg = f"The business reports a net profit margin of {financial_summary.get('Profit Margin', 'N/A')}. Revenue is {financial_summary.get('Total Revenue', '0')}."
@@ -130,191 +211,555 @@ def analyze_with_llm(financial_summary, language="English"):
         }
         return json.dumps(fallback_data)
 
-@app.post("/analyze")
-async def analyze_financials(
-    file: UploadFile = File(...),
-    company_name: str = Form(...),
-    industry: str = Form(...),
-    language: str = Form("English"),
-    db: Session = Depends(get_db)
-):
-    # 1. Read the File (PDF or CSV)
+def save_analysis(db, company_name, industry, filename, financial_summary, health_score, ai_insight):
+    """
+    Persists the company, the encrypted report and the compliance audit log as a
+    single unit of work (one commit), or hands them to the write-behind buffer.
+    Errors are logged and swallowed so the analysis is still returned to the user.
+    """
     try:
-        contents = await file.read()
-        
-        if file.filename.endswith('.pdf'):
-            df = parse_pdf(contents)
+        logger.debug("Attempting to save to database...")
+        record = AnalysisRecord(company_name, industry, filename, financial_summary, health_score, ai_insight)
+        if write_behind is not None:
+            write_behind.add(record)
+            logger.debug("Analysis queued for write-behind.")
+            return
+        save_records(db, [record])
+        logger.info("Database save successful (Encrypted)! Audit Log Saved.")
+    except Exception as e:
+        logger.error("CRITICAL DATABASE ERROR: %s", e)
+        # Proceed to return result to user even if DB fails
+
+# Optional write-behind: buffer reports/audit logs and bulk insert them (WRITE_BEHIND=true)
+write_behind = WriteBehindBuffer(SessionLocal) if WRITE_BEHIND else None
+
+# Worker threads for the CPU/DB-bound pipeline stages of /analyze
+stage_executor = ThreadPoolExecutor(max_workers=int(os.getenv("STAGE_WORKERS", "4")), thread_name_prefix="stage")
+
+async def read_upload(file, aggregate=False):
+    """
+    Parses one uploaded statement (PDF, GSTR-1 JSON or CSV) into a DataFrame with
+    standard lowercase columns. Returns (df, aggregates). With aggregate=True a
+    CSV is folded chunk by chunk into RunningAggregates and its rows are never
+    held together: df is then an empty frame with the upload's columns.
+    aggregates is None otherwise. Raises HTTPException(400) when the file is unusable.
+    """
+    loop = asyncio.get_running_loop()
+    aggregates = None
+    kind = "pdf" if file.filename.endswith('.pdf') else "gst" if file.filename.endswith('.json') else "csv"
+
+    with span("parse_file", kind=kind, bytes=file.size) as tags:
+        if kind == "pdf":
+            contents = await file.read()
+            tags["bytes"] = len(contents)
+            df = await loop.run_in_executor(stage_executor, parse_pdf, contents)
+            tags["pages"] = df.attrs.get("pages")
+            if tags["pages"] is not None:
+                UPLOAD_PAGES.observe(tags["pages"])
             if df.empty:
                 raise HTTPException(status_code=400, detail="Could not parse PDF. Ensure it contains transaction text.")
-        elif file.filename.endswith('.json'):
-            # GST Handling
-            df = parse_gstr1(contents)
+        elif kind == "gst":
+            # GST Handling: streamed straight from the spooled upload
+            df = await loop.run_in_executor(stage_executor, parse_gstr1, file.file)
             if df.empty:
                  raise HTTPException(status_code=400, detail="Could not parse JSON. Ensure it is a valid GSTR-1 format.")
         else:
-            # CSV Handling
-            df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-        
-        # Normalize column names to lowercase for flexibility
-        df.columns = [c.strip().lower() for c in df.columns]
-        
-        # Map common column names to standard 'amount' and 'date'
-        col_map = {
-            'amount': 'amount', 'value': 'amount', 'total': 'amount',
-            'date': 'date', 'transaction_date': 'date', 'time': 'date',
-            'desc': 'description', 'memo': 'description', 'description': 'description'
-        }
-        
-        df = df.rename(columns=col_map)
-
-        if 'amount' not in df.columns:
-             raise HTTPException(status_code=400, detail="CSV must contain an 'Amount' or 'Value' column")
-
-        # Clean data
-        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0)
-
-        # Calculate Metrics
-        total_revenue = float(df[df['amount'] > 0]['amount'].sum())
-        total_expenses = float(abs(df[df['amount'] < 0]['amount'].sum()))
-        net_profit = float(total_revenue - total_expenses)
-        profit_margin = (net_profit / total_revenue) * 100 if total_revenue > 0 else 0
-        health_score = int(min(100, max(0, profit_margin * 2 + 50))) # Simple logic: Base 50 + 2*Margin
-
-        financial_summary = {
-            "Total Revenue": total_revenue,
-            "Total Expenses": total_expenses,
-            "Net Profit": net_profit,
-            "Profit Margin": f"{profit_margin:.2f}%",
-            "Industry": industry,
-            "Company": company_name
-        }
+            # CSV Handling: stream the spooled upload in chunks instead of holding bytes + str + DataFrame
+            if aggregate:
+                columns, aggregates = await loop.run_in_executor(stage_executor, aggregate_csv_stream, file.file)
+                df = pd.DataFrame(columns=columns)
+            else:
+                df, _ = await loop.run_in_executor(stage_executor, read_csv_stream, file.file)
+        tags["rows"] = aggregates.transactions if aggregates is not None else len(df)
+
+    UPLOAD_ROWS.observe(tags["rows"], kind)
+    if tags["bytes"] is not None:
+        UPLOAD_BYTES.observe(tags["bytes"], kind)
+    
+    # Normalize column names to lowercase for flexibility
+    df.columns = [c.strip().lower() for c in df.columns]
+    
+    # Map common column names to standard 'amount' and 'date'
+    df = df.rename(columns=COLUMN_MAP)
 
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+    if 'amount' not in df.columns:
+         raise HTTPException(status_code=400, detail="CSV must contain an 'Amount' or 'Value' column")
 
-    # 2. Get AI Analysis
-    try:
-        print(f"Starting AI Analysis for {company_name} in language: {language}...")
-        ai_insight = analyze_with_llm(financial_summary, language)
-        print("AI Analysis Result (first 100 chars):", str(ai_insight)[:100])
-    except Exception as e:
-        print(f"CRITICAL AI ERROR: {e}")
-        ai_insight = '{"executive_summary": "AI Analysis Failed due to internal error.", "creditworthiness": "Unknown"}'
+    return df, aggregates
 
-    # 3. Save to Database
-    try:
-        print("Attempting to save to database...")
-        # Create Company if not exists (Simplified logic)
-        company = Company(name=company_name, industry=industry)
-        db.add(company)
-        db.commit()
-        db.refresh(company)
-
-        from crypto_utils import encrypt_value
-
-        report = FinancialReport(
-            company_id=company.id,
-            upload_filename=file.filename,
-            revenue=encrypt_value(total_revenue),    # Encrypted
-            expenses=encrypt_value(total_expenses),  # Encrypted
-            net_profit=encrypt_value(net_profit),    # Encrypted
-            health_score=health_score,
-            ai_analysis_text=str(ai_insight)
-        )
-        db.add(report)
-        db.commit()
-        print("Database save successful (Encrypted)!")
+def summarize_metrics(df, totals, company_name, industry):
+    """
+    Calculates the headline metrics sent to the LLM. Returns (financial_summary,
+    health_score, totals). totals holds int cents ({"revenue_cents",
+    "expense_cents"}); when None they are summed from the frame. The cents
+    totals are what the tax and working capital stages read; amounts become
+    display units only in financial_summary.
+    """
+    if totals is None:
+        totals = split_totals(frame_cents(df))
+    revenue_cents = totals["revenue_cents"]
+    net_profit_cents = revenue_cents - totals["expense_cents"]
+    profit_margin = (net_profit_cents / revenue_cents) * 100 if revenue_cents > 0 else 0
+    health_score = int(min(100, max(0, profit_margin * 2 + 50))) # Simple logic: Base 50 + 2*Margin
+
+    financial_summary = {
+        "Total Revenue": units(revenue_cents),
+        "Total Expenses": units(totals["expense_cents"]),
+        "Net Profit": units(net_profit_cents),
+        "Profit Margin": f"{profit_margin:.2f}%",
+        "Industry": industry,
+        "Company": company_name
+    }
+    return financial_summary, health_score, totals
+
+def aggregate_stages(aggregates):
+    """
+    run_analysis keyword arguments for an upload read as running aggregates
+    (read_upload(..., aggregate=True)); none for uploads read as a frame.
+    """
+    if aggregates is None:
+        return {}
+    return {"ledger": aggregates.ledger(), "bookkeeping_data": aggregates.bookkeeping(), "rows": aggregates.transactions}
+
+# Pipeline stages whose results appear in the /analyze response (and in job progress)
+RESPONSE_STAGES = ("llm", "forecast", "bookkeeping", "tax", "working_capital")
+
+async def run_analysis(df, financial_summary, health_score, totals, company_name, industry, language, filename, db, timings, request_start, on_stage=None, ledger=None, bookkeeping_data=None, rows=None):
+    """
+    Runs the LLM, forecast, bookkeeping, tax, working capital and DB stages over
+    one parsed ledger and builds the /analyze response. totals are the
+    upload's int cents totals (see summarize_metrics).
+    on_stage(name, ms, result) receives progress as each stage finishes.
+    ledger / bookkeeping_data, when given (running aggregates: streamed CSVs and
+    incremental mode), replace the ledger and bookkeeping stages' own work over
+    df; rows is then the number of transactions behind them.
+    """
+    if rows is None:
+        rows = len(df)
+    # Standardize columns for consistency
+    df.columns = df.columns.str.lower().str.strip()
 
-        # 4. Save Audit Log (Regulatory Compliance)
+    # 2. Get AI Analysis
+    async def llm_stage():
         try:
-             # Extract simple verdict (e.g., Creditworthiness) or default
-             verdict = "Analysis Complete"
-             try:
-                 parsed_ai = json.loads(ai_insight)
-                 # Check common key variations
-                 cw = parsed_ai.get('creditworthiness') or parsed_ai.get('Creditworthiness') or parsed_ai.get('credit_worthiness') or 'Unknown'
-                 verdict = f"Credit: {cw}"
-             except Exception as e:
-                 print(f"Verdict Extraction Failed: {e}")
-                 verdict = "Credit: Unknown (Parse Error)"
-
-             audit_log = ComplianceLog(
-                 company_name=company_name,
-                 action_type="AI Risk Assessment",
-                 ai_model="GPT-5",
-                 decision_summary=verdict
-             )
-             db.add(audit_log)
-             db.commit()
-             print("Audit Log Saved.")
+            logger.info("Starting AI Analysis for %s in language: %s...", company_name, language)
+            ai_insight = await analyze_with_llm(financial_summary, language)
+            logger.debug("AI Analysis Result (first 100 chars): %.100s", ai_insight)
         except Exception as e:
-             print(f"AUDIT LOG ERROR: {e}")
+            logger.error("CRITICAL AI ERROR: %s", e)
+            ai_insight = '{"executive_summary": "AI Analysis Failed due to internal error.", "creditworthiness": "Unknown"}'
+        return ai_insight
+
+    # 2-7. Dependency-aware pipeline: the LLM call, the ledger -> forecast / bookkeeping
+    # chain and the DB save run concurrently; tax and working capital start as soon
+    # as bookkeeping finishes. Each module keeps its own error handling (None on failure).
+    def report_stage(name, ms, result):
+        if on_stage is not None:
+            if name == "bookkeeping":
+                result = bookkeeping_response(result)
+            on_stage(name, ms, result if name in RESPONSE_STAGES else None)
+
+    pipeline = Pipeline(stage_executor, on_stage=report_stage)
+    pipeline.add("llm", llm_stage)
+    # Shared preprocessing: parse dates once, sort, and build the monthly aggregate
+    pipeline.add("ledger", (lambda: ledger) if ledger is not None else (lambda: prepare_ledger(df)))
+    pipeline.add("forecast", lambda ledger: generate_forecast(df, ledger), deps=["ledger"])
+    if bookkeeping_data is not None:
+        pipeline.add("bookkeeping", lambda ledger: bookkeeping_data, deps=["ledger"])
+    else:
+        pipeline.add("bookkeeping", lambda ledger: auto_categorize(df, ledger), deps=["ledger"])
+    pipeline.add(
+        "database",
+        lambda ai_insight: save_analysis(db, company_name, industry, filename, financial_summary, health_score, ai_insight),
+        deps=["llm"]
+    )
+    pipeline.add("tax", lambda bookkeeping_data: calculate_tax(totals, bookkeeping_data), deps=["bookkeeping"])
+    pipeline.add(
+        "working_capital",
+        lambda bookkeeping_data, ledger: analyze_working_capital(totals, bookkeeping_data, ledger),
+        deps=["bookkeeping", "ledger"]
+    )
+    results = await pipeline.run()
+
+    timings.update(pipeline.timings)
+    timings["total"] = round((time.perf_counter() - request_start) * 1000, 2)
+    for stage, ms in pipeline.timings.items():
+        record_span(stage, ms / 1000, {"company": company_name, "rows": rows})
+    record_span("total", timings["total"] / 1000, {"company": company_name, "rows": rows})
+    logger.info("Stage timings (ms) for %s: %s", company_name, timings)
 
-    except Exception as e:
-        print(f"CRITICAL DATABASE ERROR: {e}")
-        # Proceed to return result to user even if DB fails
+    return {
+        "metrics": financial_summary,
+        "health_score": health_score,
+        "ai_analysis": results["llm"],
+        "forecast": results["forecast"],
+        "bookkeeping": bookkeeping_response(results["bookkeeping"]),
+        "tax": results["tax"],
+        "working_capital": results["working_capital"],
+        "timings_ms": timings
+    }
 
-    # Standardize columns for consistency
-    if df is not None:
-        df.columns = df.columns.str.lower().str.strip()
+@app.post("/analyze")
+async def analyze_financials(
+    file: UploadFile = File(...),
+    company_name: str = Form(...),
+    industry: str = Form(...),
+    language: str = Form("English"),
+    db: Session = Depends(get_db)
+):
+    request_start = time.perf_counter()
+    timings = {}
 
-    # 4. Generate Forecast
-    forecast_data = None
+    # 1. Read the File (PDF or CSV)
     try:
-        if df is not None:
-             forecast_data = generate_forecast(df)
+        df, aggregates = await read_upload(file, aggregate=True)
+        financial_summary, health_score, totals = summarize_metrics(df, aggregates.totals() if aggregates else None, company_name, industry)
     except Exception as e:
-        print(f"Forecast Module Error: {e}")
+        raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+
+    timings["parse"] = round((time.perf_counter() - request_start) * 1000, 2)
+
+    return await run_analysis(
+        df, financial_summary, health_score, totals, company_name, industry, language,
+        file.filename, db, timings, request_start, **aggregate_stages(aggregates)
+    )
+
+@app.post("/analyze/batch")
+async def analyze_financials_batch(
+    files: List[UploadFile] = File(...),
+    company_name: str = Form(...),
+    industry: str = Form(...),
+    language: str = Form("English"),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyzes many statements (CSV, PDF, GSTR-1 JSON) for one company in one call:
+    files are parsed in parallel, merged and de-duplicated, then forecast, LLM
+    analysis and DB save run once over the combined ledger.
+    """
+    request_start = time.perf_counter()
+    timings = {}
+
+    # 1. Parse every file concurrently; one bad file does not sink the batch
+    outcomes = await asyncio.gather(*(read_upload(f) for f in files), return_exceptions=True)
+
+    frames = []
+    file_report = []
+    for f, outcome in zip(files, outcomes):
+        if isinstance(outcome, Exception):
+            error = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+            logger.warning("Batch Parse Error (%s): %s", f.filename, error)
+            file_report.append({"filename": f.filename, "rows": 0, "error": error})
+            continue
+        df, _ = outcome
+        frames.append(df)
+        file_report.append({"filename": f.filename, "rows": len(df), "error": None})
+
+    if not frames:
+        raise HTTPException(status_code=400, detail="None of the uploaded files could be parsed.")
 
-    # 5. Automated Bookkeeping
-    bookkeeping_data = None
     try:
-        if df is not None:
-             bookkeeping_data = auto_categorize(df)
+        df = merge_transactions(frames)
+        financial_summary, health_score, totals = summarize_metrics(df, None, company_name, industry)
     except Exception as e:
-        print(f"Bookkeeping Module Error: {e}")
+        raise HTTPException(status_code=400, detail=f"Error processing files: {str(e)}")
+
+    timings["parse"] = round((time.perf_counter() - request_start) * 1000, 2)
+
+    parsed_rows = sum(len(frame) for frame in frames)
+    filenames = ", ".join(r["filename"] for r in file_report if r["error"] is None)
+    response = await run_analysis(
+        df, financial_summary, health_score, totals, company_name, industry, language,
+        filenames, db, timings, request_start
+    )
+    response["files"] = file_report
+    response["transactions"] = {
+        "parsed": parsed_rows,
+        "merged": len(df),
+        "duplicates_removed": parsed_rows - len(df)
+    }
+    return response
+
+@app.post("/analyze/append")
+async def analyze_append(
+    file: UploadFile = File(...),
+    company_name: str = Form(...),
+    industry: str = Form(...),
+    language: str = Form("English"),
+    reset: bool = Form(False),
+    db: Session = Depends(get_db)
+):
+    """
+    Incremental analysis: the upload holds only new transactions (e.g. the
+    latest week). They are folded into the company's stored running
+    aggregates in O(new rows), and metrics, forecast, tax and working capital
+    are computed from those aggregates instead of the full history.
+    reset=true makes this upload the new baseline.
+    """
+    request_start = time.perf_counter()
+    timings = {}
 
-    # 6. Tax Compliance
-    tax_data = None
     try:
-        tax_data = calculate_tax(financial_summary, bookkeeping_data)
+        df, _ = await read_upload(file)
+        aggregates = await asyncio.get_running_loop().run_in_executor(
+            stage_executor, append_transactions, db, company_name, industry, df, reset
+        )
+        financial_summary, health_score, totals = summarize_metrics(df, aggregates.totals(), company_name, industry)
     except Exception as e:
-        print(f"Tax Module Error: {e}")
+        raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+
+    timings["parse"] = round((time.perf_counter() - request_start) * 1000, 2)
+
+    response = await run_analysis(
+        df, financial_summary, health_score, totals, company_name, industry, language,
+        file.filename, db, timings, request_start,
+        ledger=aggregates.ledger(), bookkeeping_data=aggregates.bookkeeping()
+    )
+    response["transactions"] = {"appended": len(df), "total": aggregates.transactions}
+    return response
+
+PORTFOLIO_COLUMNS = ["company_id", "date", "amount"]
 
-    # 7. Working Capital
-    wc_data = None
+def read_portfolio_csv(fileobj):
+    df = pd.read_csv(fileobj, usecols=lambda c: c.strip().lower() in PORTFOLIO_COLUMNS)
+    df.columns = [c.strip().lower() for c in df.columns]
+    return df
+
+@app.post("/forecast/batch")
+async def forecast_portfolio(file: UploadFile = File(...)):
+    """
+    Forecasts every client company in one call, from a long-format CSV with
+    company_id, date and amount columns (one row per transaction).
+    """
+    loop = asyncio.get_running_loop()
     try:
-        wc_data = analyze_working_capital(financial_summary, bookkeeping_data)
+        df = await loop.run_in_executor(stage_executor, read_portfolio_csv, file.file)
     except Exception as e:
-        print(f"Working Capital Module Error: {e}")
+        raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+    missing = [c for c in PORTFOLIO_COLUMNS if c not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(missing)}")
 
+    start = time.perf_counter()
+    forecasts = await loop.run_in_executor(stage_executor, forecast_batch, df)
     return {
-        "metrics": financial_summary,
-        "health_score": health_score,
-        "ai_analysis": ai_insight,
-        "forecast": forecast_data,
-        "bookkeeping": bookkeeping_data,
-        "tax": tax_data,
-        "working_capital": wc_data
+        "companies": len(forecasts),
+        "forecasts": forecasts,
+        "timings_ms": {"forecast": round((time.perf_counter() - start) * 1000, 2)}
     }
 
+# ==========================================
+# BACKGROUND JOBS (submit now, poll for stage-by-stage results)
+# ==========================================
+async def run_job(job, on_stage):
+    """
+    Runs one queued /jobs/analyze submission from its spooled upload.
+    """
+    params = job["params"]
+    request_start = time.perf_counter()
+    timings = {}
+    db = SessionLocal()
+    try:
+        with open(job["upload_path"], "rb") as fh:
+            upload = UploadFile(file=fh, filename=params["filename"])
+            try:
+                df, aggregates = await read_upload(upload, aggregate=True)
+                financial_summary, health_score, totals = summarize_metrics(df, aggregates.totals() if aggregates else None, params["company_name"], params["industry"])
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+
+        timings["parse"] = round((time.perf_counter() - request_start) * 1000, 2)
+        on_stage("parse", timings["parse"], {"metrics": financial_summary, "health_score": health_score})
+
+        return await run_analysis(
+            df, financial_summary, health_score, totals, params["company_name"], params["industry"],
+            params["language"], params["filename"], db, timings, request_start, on_stage=on_stage,
+            **aggregate_stages(aggregates)
+        )
+    finally:
+        db.close()
+
+job_store = JobStore()
+job_queue = JobQueue(job_store, run_job)
+
+@app.post("/jobs/analyze", status_code=202)
+async def submit_analysis_job(
+    file: UploadFile = File(...),
+    company_name: str = Form(...),
+    industry: str = Form(...),
+    language: str = Form("English")
+):
+    """
+    Queues an analysis and returns a job id immediately; poll /jobs/{job_id}.
+    Rejected with 429 once JOB_QUEUE_SIZE jobs are already waiting.
+    """
+    if job_queue.waiting >= job_queue.max_queued:
+        raise HTTPException(status_code=429, detail="Job queue is full. Please retry shortly.", headers={"Retry-After": "30"})
+
+    job_id = uuid.uuid4().hex
+    os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+    upload_path = os.path.join(JOB_SPOOL_DIR, f"{job_id}_{os.path.basename(file.filename)}")
+
+    def spool():
+        with open(upload_path, "wb") as out:
+            shutil.copyfileobj(file.file, out)
+    await asyncio.to_thread(spool)
+
+    params = {"company_name": company_name, "industry": industry, "language": language, "filename": file.filename}
+    await asyncio.to_thread(job_store.create, job_id, params, upload_path)
+    try:
+        job_queue.submit(job_id)
+    except QueueFullError as e:
+        await asyncio.to_thread(job_store.update, job_id, "rejected", error=str(e))
+        os.remove(upload_path)
+        raise HTTPException(status_code=429, detail="Job queue is full. Please retry shortly.", headers={"Retry-After": "30"})
+
+    return {"job_id": job_id, "status": "queued", "queue_position": job_queue.waiting}
+
+@app.get("/jobs/{job_id}")
+def get_analysis_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("upload_path", None)
+    return job
+
 @app.get("/compliance_logs")
-def get_compliance_logs(db: Session = Depends(get_db)):
-    # Return last 5 logs
-    logs = db.query(ComplianceLog).order_by(ComplianceLog.timestamp.desc()).limit(5).all()
+def get_compliance_logs(
+    response: Response,
+    company_name: Optional[str] = None,
+    action_type: Optional[str] = None,
+    ai_model: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(5, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    Newest logs first (the last 5 by default), filterable by company, action
+    type, model and time range. When more rows exist, the X-Next-Cursor header
+    holds the cursor for the next page.
+    """
+    try:
+        logs, next_cursor = query_logs(
+            db, company_name=company_name, action_type=action_type, ai_model=ai_model,
+            since=since, until=until, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return logs
 
+@app.get("/compliance_logs/export")
+def export_compliance_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    company_name: Optional[str] = None,
+    action_type: Optional[str] = None,
+    ai_model: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None
+):
+    """
+    Streams every matching log as NDJSON or CSV for bulk audit pulls, in
+    keyset batches so server memory stays flat regardless of result size.
+    """
+    filters = dict(company_name=company_name, action_type=action_type, ai_model=ai_model, since=since, until=until)
+
+    def stream():
+        # Own session: the response body is produced after the endpoint returns
+        db = SessionLocal()
+        try:
+            export = export_csv if format == "csv" else export_ndjson
+            yield from export(db, **filters)
+        finally:
+            db.close()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="compliance_logs.{format}"'}
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
+
+@app.get("/companies/{company_id}/history")
+def get_company_history(company_id: int, db: Session = Depends(get_db)):
+    """
+    Revenue, expenses, net profit and health score across every upload for a
+    company, oldest first. Decrypted values come from history_cache.
+    """
+    company = db.get(Company, company_id)
+    if company is None:
+        raise HTTPException(status_code=404, detail="Company not found")
+    return company_history(db, company)
+
+@app.get("/history_cache/stats")
+def get_history_cache_stats():
+    return history_cache.stats()
+
+@app.get("/db_pool/stats")
+def get_db_pool_stats():
+    return pool_status()
+
+@app.get("/llm_cache/stats")
+def get_llm_cache_stats():
+    return analysis_cache.stats()
+
+@app.get("/profiles/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = Query("summary", pattern="^(summary|collapsed)$"),
+    x_profile: str | None = Header(None)
+):
+    """
+    A saved request profile: the summary (hottest functions by self and total
+    samples) or the full collapsed stacks for flamegraph tools.
+    Needs the X-Profile header set to PROFILE_TOKEN, like profiling a request.
+    """
+    if not token_matches(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this caller")
+    profile = profile_store.load(profile_id, collapsed=format == "collapsed")
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return Response(content=profile, media_type="text/plain")
+    return profile
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus text exposition: stage, upload, LLM and DB pool histograms plus
+    cache and pool figures read at scrape time.
+    """
+    llm = analysis_cache.stats()
+    caches = {
+        "llm": (llm["memory_hits"] + llm["db_hits"], llm["misses"]),
+        "history": (history_cache.hits, history_cache.refreshes),
+        "report": (report_cache.hits, report_cache.misses),
+        "company_id": (company_ids.hits, company_ids.misses),
+    }
+    pool = pool_status()
+    pool_gauges = {(k,): pool[k] for k in ("size", "checked_out", "overflow", "idle") if k in pool}
+    body = render_metrics(
+        sample_family("finhealth_cache_hits_total", "counter", "Cache hits by cache.", ["cache"],
+                      {(name,): hits for name, (hits, _) in caches.items()}),
+        sample_family("finhealth_cache_misses_total", "counter", "Cache misses by cache.", ["cache"],
+                      {(name,): misses for name, (_, misses) in caches.items()}),
+        sample_family("finhealth_db_pool_connections", "gauge", "Connection pool occupancy.", ["state"], pool_gauges),
+        sample_family("finhealth_log_records_dropped_total", "counter", "Log records dropped because the log queue was full.", [],
+                      {(): dropped_records()}),
+    )
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 from banking_mock import get_mock_bank_data
 
 @app.get("/connect_bank/{bank_name}")
 async def connect_bank(bank_name: str):
-    print(f"Connecting to bank: {bank_name}")
+    logger.info("Connecting to bank: %s", bank_name)
     try:
         data = get_mock_bank_data(bank_name)
-        print(f"Bank Data: {data}")
+        logger.debug("Bank Data: %s", data)
         return data
     except Exception as e:
-        print(f"BANK ERROR: {e}")
+        logger.error("BANK ERROR: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/generate_report")
@@ -322,11 +767,59 @@ async def get_report(data: dict):
     company_name = data.get("company_name", "SME")
     result_data = data.get("result", {})
     
-    pdf_bytes = generate_pdf_report(company_name, result_data)
+    _, pdf_bytes = render_report(company_name, result_data)
     
     # Return as downloadable file
     return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename=Report_{company_name}.pdf"})
 
+@app.get("/reports/{report_id}/pdf")
+def get_stored_report(report_id: int, db: Session = Depends(get_db)):
+    """
+    One-pager for a stored report. Identical content is served from report_cache;
+    the ETag is the content hash.
+    """
+    payloads = stored_report_payloads(db, report_ids=[report_id])
+    if not payloads:
+        raise HTTPException(status_code=404, detail="Report not found")
+    _, company_name, result = payloads[0]
+    key, pdf_bytes = render_report(company_name, result)
+    headers = {
+        "Content-Disposition": f"attachment; filename={report_filename(company_name, report_id)}",
+        "ETag": f'"{key}"',
+    }
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+MAX_BATCH_REPORTS = int(os.getenv("MAX_BATCH_REPORTS", "5000"))
+
+@app.post("/reports/batch")
+def export_reports(data: dict, db: Session = Depends(get_db)):
+    """
+    ZIP of one-pagers, streamed as they are rendered. Body: {"report_ids": [...]}
+    or {"company_ids": [...]} for each company's latest report.
+    """
+    report_ids, company_ids = data.get("report_ids"), data.get("company_ids")
+    ids = report_ids if report_ids is not None else company_ids
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+        raise HTTPException(status_code=400, detail="Provide a non-empty list of integer report_ids or company_ids.")
+    if len(ids) > MAX_BATCH_REPORTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_REPORTS} reports per batch.")
+
+    if report_ids is not None:
+        payloads = stored_report_payloads(db, report_ids=report_ids)
+    else:
+        payloads = stored_report_payloads(db, company_ids=company_ids)
+    if not payloads:
+        raise HTTPException(status_code=404, detail="No reports found")
+
+    names = [report_filename(company_name, report_id) for report_id, company_name, _ in payloads]
+    pdfs = render_reports([(company_name, result) for _, company_name, result in payloads])
+    headers = {"Content-Disposition": "attachment; filename=reports.zip"}
+    return StreamingResponse(stream_zip(zip(names, pdfs)), media_type="application/zip", headers=headers)
+
+@app.get("/report_cache/stats")
+def get_report_cache_stats():
+    return report_cache.stats()
+
 # ==========================================
 # CATCH-ALL ROUTE FOR REACT (MUST BE LAST)
 # ==========================================
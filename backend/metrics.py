@@ -0,0 +1,133 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from log_utils import get_logger
+
+logger = get_logger("spans")
+
+# Seconds; covers sub-millisecond stages up to slow LLM round trips
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    """
+    Prometheus-style histogram with optional labels. observe() is a lock, a
+    bisect and three additions, cheap enough for every request.
+    """
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labelvalues, counts, total, count in sorted(series):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {count}")
+        return "\n".join(lines)
+
+class Counter:
+    """
+    Monotonic counter with optional labels.
+    """
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return sample_family(self.name, "counter", self.help_text, self.labelnames, dict(values))
+
+def sample_family(name, kind, help_text, labelnames, values):
+    """
+    Text exposition for a counter/gauge family: values maps label value tuples to numbers.
+    Used for figures read at scrape time (cache and pool stats).
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labelvalues, value in values.items():
+        lines.append(f"{name}{_labels(labelnames, labelvalues)} {value}")
+    return "\n".join(lines)
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram("finhealth_stage_seconds", "Latency of each analysis stage (total = whole request).", ["stage"])
+UPLOAD_ROWS = Histogram("finhealth_upload_rows", "Transactions parsed per upload.", ["kind"], SIZE_BUCKETS)
+UPLOAD_BYTES = Histogram("finhealth_upload_bytes", "Size of each uploaded statement.", ["kind"], SIZE_BUCKETS)
+UPLOAD_PAGES = Histogram("finhealth_upload_pages", "Pages per uploaded PDF statement.", (), (1, 2, 5, 10, 25, 50, 100, 250, 500))
+LLM_SECONDS = Histogram("finhealth_llm_seconds", "LLM analysis latency by outcome (ok, cache, fallback, error).", ["outcome"])
+LLM_TOKENS = Histogram("finhealth_llm_tokens", "Tokens per LLM call.", ["kind"], TOKEN_BUCKETS)
+DB_POOL_WAIT_SECONDS = Histogram("finhealth_db_pool_wait_seconds", "Time spent waiting for a pooled DB connection.")
+DB_POOL_TIMEOUTS = Counter("finhealth_db_pool_timeouts_total", "Checkouts that timed out waiting for a DB connection.")
+
+@contextmanager
+def span(stage, **tags):
+    """
+    Times a block into finhealth_stage_seconds{stage} and logs it at DEBUG with
+    its tags (rows, bytes, pages, ...). Tags can be added inside the block
+    through the yielded dict, e.g. the row count once parsing is done.
+    """
+    start = time.perf_counter()
+    try:
+        yield tags
+    finally:
+        record_span(stage, time.perf_counter() - start, tags)
+
+def record_span(stage, seconds, tags=None):
+    """
+    Records an already measured stage (e.g. from Pipeline.timings).
+    """
+    STAGE_SECONDS.observe(seconds, stage)
+    if tags:
+        logger.debug("span stage=%s ms=%.2f %s", stage, seconds * 1000, " ".join(f"{k}={v}" for k, v in tags.items()))
+    else:
+        logger.debug("span stage=%s ms=%.2f", stage, seconds * 1000)
+
+def render(*families):
+    """
+    Every registered metric plus any scrape-time families, in the Prometheus text format.
+    """
+    return "\n".join([metric.render() for metric in REGISTRY] + list(families)) + "\n"
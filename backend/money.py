@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Money is carried as int64 cents (minor units) from parsing through tax and working
+# capital, and converted to display units only when building API responses.
+# Integer sums are exact, so totals no longer depend on row order.
+CENTS_PER_UNIT = 100
+
+def to_cents(amounts):
+    """
+    Amounts in display units (floats, numeric strings) -> int64 cents array.
+    Missing or unparseable values count as 0. Parsed two-decimal amounts are
+    recovered exactly (up to ~9e13 units).
+    """
+    values = pd.to_numeric(pd.Series(amounts), errors='coerce').to_numpy(dtype=np.float64, na_value=0.0)
+    return np.rint(np.where(np.isfinite(values), values, 0.0) * CENTS_PER_UNIT).astype(np.int64)
+
+def cents(value):
+    """
+    One display-unit amount -> int cents.
+    """
+    if value is None:
+        return 0
+    return int(round(float(value) * CENTS_PER_UNIT))
+
+def units(amount_cents):
+    """
+    int cents -> display units (the nearest float to the exact decimal value).
+    """
+    return int(amount_cents) / CENTS_PER_UNIT
+
+def split_totals(amount_cents):
+    """
+    Revenue (positive) and expense (absolute negative) cent totals of an int64
+    cents array, as Python ints.
+    """
+    amount_cents = np.asarray(amount_cents, dtype=np.int64)
+    return {
+        "revenue_cents": int(amount_cents[amount_cents > 0].sum()),
+        "expense_cents": int(-amount_cents[amount_cents < 0].sum()),
+    }
+
+def percent_of(amount_cents, percent):
+    """
+    percent% of an amount in cents, rounded half up to whole cents.
+    """
+    return (int(amount_cents) * percent + 50) // 100
+
+def mean_cents(amount_cents):
+    """
+    Mean of an int cents array, rounded half up to whole cents.
+    """
+    count = len(amount_cents)
+    return (int(np.sum(amount_cents)) * 2 + count) // (2 * count)
+
+def frame_cents(df):
+    """
+    A transaction frame's amounts as int64 cents: its amount_cents column when
+    it is a compact frame, otherwise converted from 'amount'.
+    """
+    if 'amount_cents' in df.columns:
+        return df['amount_cents'].to_numpy(dtype=np.int64)
+    return to_cents(df['amount'])
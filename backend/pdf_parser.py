@@ -1,85 +1,141 @@
 import pandas as pd
 from pypdf import PdfReader
+from transactions import compact_transactions
+from concurrent.futures.process import BrokenProcessPool
 import io
+import os
 import re
 
+from log_utils import get_logger
+from process_pools import ProcessPool
+
+logger = get_logger("pdf_parser")
+
+# Statements with at least this many pages are split across a process pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+
+# Robust Parsing Strategy using Regex
+# Look for lines that look like transactions:
+# Date (YYYY-MM-DD or DD/MM/YYYY) ... Description ... Amount (Positive/Negative)
+
+# Regex for Date: \d{2,4}[-/]\d{1,2}[-/]\d{2,4}
+# Regex for Amount: [-+]?[\d,]+\.\d{2}
+DATE_PATTERN = re.compile(r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})')
+# Amount pattern: looks for numbers with optional commas and a decimal point, possibly negative
+AMOUNT_PATTERN = re.compile(r'([-+]?[\d,]+\.\d{2})')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+_pool = ProcessPool(PDF_WORKERS)
+
+def _parse_page_text(text):
+    """
+    Line-level regex extraction for one page of statement text.
+    """
+    transactions = []
+    for line in text.split('\n'):
+        date_match = DATE_PATTERN.search(line)
+        if not date_match:
+            continue
+        amount_matches = AMOUNT_PATTERN.findall(line)
+        if not amount_matches:
+            continue
+
+        date_str = date_match.group(1)
+        # Take the last match as amount (often balance is last, checking this heuristic)
+        # Actually, typically: Date | Desc | Debit | Credit | Balance
+        # We need the transaction amount.
+        # Let's assume the largest absolute value implies the transaction if multiple numbers exist?
+        # Or simplistic: If 1 number -> Amount. If 2 -> Debit/Credit?
+        # Let's just grab the last amount found on the line for now, but handle commas
+
+        amount_str = amount_matches[-1].replace(',', '')
+        try:
+            amount = float(amount_str)
+
+            # Description: Everything else?
+            # Remove date and amount from line to get description
+            desc = line.replace(date_str, '').replace(amount_matches[-1], '').strip()
+            # Clean up random chars
+            desc = WHITESPACE_PATTERN.sub(' ', desc)
+
+            transactions.append({
+                "date": date_str,
+                "description": desc,
+                "amount": amount
+            })
+        except:
+            continue
+    return transactions
+
+def _parse_page_range(file_bytes, start, stop):
+    """
+    Process pool worker: opens its own reader and parses pages [start, stop).
+    """
+    return _parse_pages(PdfReader(io.BytesIO(file_bytes)), start, stop)
+
+def _parse_pages(reader, start, stop):
+    """
+    Extracts and parses pages [start, stop) in page order.
+    Returns (transactions, first_page_text).
+    """
+    transactions = []
+    first_text = None
+    for index in range(start, stop):
+        text = reader.pages[index].extract_text()
+        if first_text is None:
+            first_text = text
+        transactions.extend(_parse_page_text(text))
+    return transactions, first_text
+
 def parse_pdf(file_bytes):
     """
     Parses a PDF bank statement and returns a DataFrame.
+    Statements of PDF_PARALLEL_MIN_PAGES pages or more are parsed in page chunks
+    across a process pool; results are merged back in page order.
     """
     try:
         reader = PdfReader(io.BytesIO(file_bytes))
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-            
-        print("DEBUG: Extracted PDF Text Sample:", text[:200]) # For debugging
-        
-        # Robust Parsing Strategy using Regex
-        # Look for lines that look like transactions:
-        # Date (YYYY-MM-DD or DD/MM/YYYY) ... Description ... Amount (Positive/Negative)
-        
-        # Regex for Date: \d{2,4}[-/]\d{1,2}[-/]\d{2,4}
-        # Regex for Amount: [-+]?[\d,]+\.\d{2}
-        
-        transactions = []
-        lines = text.split('\n')
-        
-        date_pattern = re.compile(r'(\d{2,4}[-/]\d{1,2}[-/]\d{2,4})')
-        # Amount pattern: looks for numbers with optional commas and a decimal point, possibly negative
-        amount_pattern = re.compile(r'([-+]?[\d,]+\.\d{2})') 
-        
-        for line in lines:
-            date_match = date_pattern.search(line)
-            amount_matches = amount_pattern.findall(line)
-            
-            if date_match and amount_matches:
-                date_str = date_match.group(1)
-                # Take the last match as amount (often balance is last, checking this heuristic)
-                # Actually, typically: Date | Desc | Debit | Credit | Balance
-                # We need the transaction amount.
-                # Let's assume the largest absolute value implies the transaction if multiple numbers exist?
-                # Or simplistic: If 1 number -> Amount. If 2 -> Debit/Credit?
-                # Let's just grab the last amount found on the line for now, but handle commas
-                
-                amount_str = amount_matches[-1].replace(',', '')
-                try:
-                    amount = float(amount_str)
-                    
-                    # Description: Everything else?
-                    # Remove date and amount from line to get description
-                    desc = line.replace(date_str, '').replace(amount_matches[-1], '').strip()
-                    # Clean up random chars
-                    desc = re.sub(r'\s+', ' ', desc)
-                    
-                    transactions.append({
-                        "date": date_str,
-                        "description": desc,
-                        "amount": amount
-                    })
-                except:
-                    continue
+        page_count = len(reader.pages)
+        workers = min(PDF_WORKERS, page_count)
+
+        chunks = None
+        if page_count >= PDF_PARALLEL_MIN_PAGES and workers > 1:
+            chunk_size = -(-page_count // workers)
+            bounds = [(start, min(start + chunk_size, page_count)) for start in range(0, page_count, chunk_size)]
+            try:
+                pool = _pool.get()
+                futures = [pool.submit(_parse_page_range, file_bytes, start, stop) for start, stop in bounds]
+                chunks = [future.result() for future in futures]
+            except BrokenProcessPool as e:
+                _pool.reset()  # Rebuilt for the next statement
+                logger.warning("PDF process pool broke, parsing in a single process: %s", e)
+                chunks = None
+            except Exception as e:
+                logger.warning("PDF Parallel Parse Error, falling back to single process: %s", e)
+                chunks = None
+        if chunks is None:
+            chunks = [_parse_pages(reader, 0, page_count)]
+
+        transactions = [tx for chunk_transactions, _ in chunks for tx in chunk_transactions]
+        logger.debug("Extracted PDF Text Sample: %.200s", chunks[0][1] or "")
 
         if not transactions:
             # Fallback for empty parse
-            print("PDF Parsing warning: No transactions found with regex.")
+            logger.warning("PDF Parsing warning: No transactions found with regex.")
             return pd.DataFrame(columns=["date", "description", "amount"])
 
-        df = pd.DataFrame(transactions)
-        
-        # Standardize Date
-        try:
-             df['date'] = pd.to_datetime(df['date'])
-        except:
-             pass # Keep as string if parsing fails
-             
+        # Standardize Date (unparseable -> NaT) and the other columns
+        df = compact_transactions(pd.DataFrame(transactions))
+        df.attrs["pages"] = page_count
+
         # Standardize Amount (Ensure correct sign logic if possible, or assume user provides signed PDF)
         # Bank statements often have columns for Debit/Credit.
-        # This regex parser is naive and assumes signed amounts or single column. 
+        # This regex parser is naive and assumes signed amounts or single column.
         # For a hackathon, this is often sufficient or we advise the user on format.
-        
+
         return df
 
     except Exception as e:
-        print(f"PDF Parse Error: {e}")
+        logger.error("PDF Parse Error: %s", e)
         return pd.DataFrame()
@@ -0,0 +1,294 @@
+import datetime
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select, insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import Company, FinancialReport, ComplianceLog, company_key
+from crypto_utils import encrypt_value
+from history import history_cache
+from log_utils import get_logger
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "50"))  # Flush once this many analyses are buffered
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "2.0"))  # ...or at least this often (seconds)
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))  # Buffered analyses before new ones are dead-lettered
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "3"))  # Failed saves of one analysis before it is dead-lettered
+WRITE_BEHIND_DEAD_LETTER = os.getenv("WRITE_BEHIND_DEAD_LETTER", "write_behind_dead_letter.jsonl")
+COMPANY_CACHE_SIZE = int(os.getenv("COMPANY_CACHE_SIZE", "10000"))  # Normalized (name, industry) -> company id entries kept in memory
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING, so concurrent get-or-creates don't fail the transaction
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+logger = get_logger("persistence")
+
+class AnalysisRecord:
+    """
+    Everything one analysis writes: the company, its encrypted report and the
+    compliance audit log. Built up front so the writes can go out in one unit of work.
+    """
+
+    def __init__(self, company_name, industry, filename, financial_summary, health_score, ai_insight):
+        self.company_name = company_name
+        self.industry = industry
+        self.filename = filename
+        self.revenue = encrypt_value(financial_summary["Total Revenue"])    # Encrypted
+        self.expenses = encrypt_value(financial_summary["Total Expenses"])  # Encrypted
+        self.net_profit = encrypt_value(financial_summary["Net Profit"])    # Encrypted
+        self.health_score = health_score
+        self.ai_analysis_text = str(ai_insight)
+        self.verdict = extract_verdict(ai_insight)
+        self.attempts = 0  # Failed write-behind saves so far
+
+    def to_dict(self):
+        return {name: value for name, value in vars(self).items() if name != "attempts"}
+
+def extract_verdict(ai_insight):
+    """
+    Extract simple verdict (e.g., Creditworthiness) or default
+    """
+    try:
+        parsed_ai = json.loads(ai_insight)
+        # Check common key variations
+        cw = parsed_ai.get('creditworthiness') or parsed_ai.get('Creditworthiness') or parsed_ai.get('credit_worthiness') or 'Unknown'
+        return f"Credit: {cw}"
+    except Exception as e:
+        logger.warning("Verdict Extraction Failed: %s", e)
+        return "Credit: Unknown (Parse Error)"
+
+class CompanyIdCache:
+    """
+    Process-local LRU of company_key -> company id. Only ids from committed
+    transactions are put here, so a rolled-back insert is never handed out.
+    """
+
+    def __init__(self, max_entries=COMPANY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            company_id = self._ids.get(key)
+            if company_id is None:
+                self.misses += 1
+                return None
+            self._ids.move_to_end(key)
+            self.hits += 1
+            return company_id
+
+    def put(self, key, company_id):
+        with self._lock:
+            self._ids[key] = company_id
+            self._ids.move_to_end(key)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+company_ids = CompanyIdCache()
+
+def get_or_create_company_id(db, name, industry, key=None):
+    """
+    Returns the id of the company matching (name, industry) after normalization,
+    inserting it inside the caller's transaction if it doesn't exist yet.
+    Lookups go through the unique (name_key, industry_key) index; the insert
+    uses ON CONFLICT DO NOTHING where supported, so two workers creating the
+    same company at once both end up with the one row.
+    """
+    name_key, industry_key = key or company_key(name, industry)
+    lookup = select(Company.id).where(Company.name_key == name_key, Company.industry_key == industry_key)
+    company_id = db.execute(lookup).scalar()
+    if company_id is not None:
+        return company_id
+
+    values = {"name": name, "industry": industry, "name_key": name_key, "industry_key": industry_key}
+    upsert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if upsert is not None:
+        db.execute(upsert(Company).values(**values).on_conflict_do_nothing(index_elements=["name_key", "industry_key"]))
+    else:
+        db.execute(insert(Company).values(**values))
+    return db.execute(lookup).scalar_one()
+
+def save_records(db, records):
+    """
+    Writes any number of analyses in a single transaction: one multi-row insert
+    per table and one commit. Rolls back everything if any insert fails.
+    Companies are reused by normalized (name, industry); repeat uploads for a
+    known company cost no company writes at all.
+    """
+    try:
+        created = {}  # company ids first seen in this transaction, cached after commit
+        record_ids = []
+        for record in records:
+            key = company_key(record.company_name, record.industry)
+            company_id = created.get(key) or company_ids.get(key)
+            if company_id is None:
+                company_id = get_or_create_company_id(db, record.company_name, record.industry, key)
+                created[key] = company_id
+            record_ids.append(company_id)
+
+        rows = []
+        for record, company_id in zip(records, record_ids):
+            rows.append(FinancialReport(
+                company_id=company_id,
+                upload_filename=record.filename,
+                revenue=record.revenue,
+                expenses=record.expenses,
+                net_profit=record.net_profit,
+                health_score=record.health_score,
+                ai_analysis_text=record.ai_analysis_text
+            ))
+            # Save Audit Log (Regulatory Compliance)
+            rows.append(ComplianceLog(
+                company_name=record.company_name,
+                action_type="AI Risk Assessment",
+                ai_model="GPT-5",
+                decision_summary=record.verdict
+            ))
+        db.add_all(rows)
+        db.commit()
+        for key, company_id in created.items():
+            company_ids.put(key, company_id)
+        for company_id in set(record_ids):
+            history_cache.invalidate(company_id)
+    except Exception:
+        db.rollback()
+        raise
+
+class WriteBehindBuffer:
+    """
+    Buffers analyses and flushes them with save_records in bulk, when max_batch
+    records are pending or every interval seconds, whichever comes first.
+    close() stops the timer and flushes whatever is left (call on shutdown).
+    When a batch fails, its records are saved one by one so one bad record
+    doesn't hold back the rest. Records that still fail are retried on later
+    flushes, up to max_retries. After that, on a full buffer (max_pending) and
+    at close(), they are appended to the dead-letter file (JSON lines; amounts
+    stay encrypted) instead of being lost.
+    """
+
+    def __init__(self, session_factory, max_batch=WRITE_BEHIND_BATCH, interval=WRITE_BEHIND_INTERVAL,
+                 max_pending=WRITE_BEHIND_MAX_PENDING, max_retries=WRITE_BEHIND_MAX_RETRIES,
+                 dead_letter_path=WRITE_BEHIND_DEAD_LETTER):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self.flushed = 0
+        self.dead_lettered = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._dead_letter_lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One flush at a time
+        self._stop = threading.Event()
+        self._timer = threading.Thread(target=self._run_timer, name="write-behind", daemon=True)
+        self._timer.start()
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def add(self, record):
+        for attempt in range(2):
+            with self._lock:
+                if len(self._pending) < self.max_pending:
+                    self._pending.append(record)
+                    full = len(self._pending) >= self.max_batch
+                    break
+            if attempt == 0:
+                self.flush()  # Buffer full: make room in the caller's thread first
+        else:
+            self._dead_letter([record], "write-behind buffer full")
+            return
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Saves the pending records; returns how many were saved.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            saved, retry = self._save(batch)
+            if retry:
+                with self._lock:
+                    self._pending = retry + self._pending
+            self.flushed += saved
+            if saved:
+                logger.info("Write-behind flush: %d analyses saved.", saved)
+            return saved
+
+    def _save(self, batch):
+        """
+        (saved count, records to retry later)
+        """
+        try:
+            self._write(batch)
+            return len(batch), []
+        except Exception as e:
+            if len(batch) > 1:
+                logger.warning("Write-behind flush of %d analyses failed, saving them one by one: %s", len(batch), e)
+            error = e
+
+        saved, retry = 0, []
+        for record in batch:
+            if len(batch) > 1:
+                try:
+                    self._write([record])
+                    saved += 1
+                    continue
+                except Exception as e:
+                    error = e
+            record.attempts += 1
+            if record.attempts >= self.max_retries:
+                self._dead_letter([record], error)
+            else:
+                retry.append(record)
+        if retry:
+            logger.error("WRITE-BEHIND FLUSH ERROR: %d analyses kept for retry: %s", len(retry), error)
+        return saved, retry
+
+    def _write(self, records):
+        db = self.session_factory()
+        try:
+            save_records(db, records)
+        finally:
+            db.close()
+
+    def _dead_letter(self, records, error):
+        failed_at = datetime.datetime.utcnow().isoformat()
+        with self._dead_letter_lock:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as fh:
+                for record in records:
+                    entry = {"failed_at": failed_at, "error": str(error), "attempts": record.attempts, "record": record.to_dict()}
+                    fh.write(json.dumps(entry, default=str) + "\n")
+            self.dead_lettered += len(records)
+        logger.error("Write-behind: %d analyses written to %s (%s)", len(records), self.dead_letter_path, error)
+
+    def close(self):
+        self._stop.set()
+        self._timer.join()
+        self.flush()
+        with self._lock:
+            leftover, self._pending = self._pending, []
+        if leftover:
+            self._dead_letter(leftover, "unsaved at shutdown")
+
+    def _run_timer(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from log_utils import get_logger
+
+logger = get_logger("pipeline")
+
+class Pipeline:
+    """
+    Minimal dependency-aware stage runner for one request.
+    Each stage starts as soon as the stages it depends on have finished and receives
+    their results as positional arguments. Sync stages run in the executor, async
+    stages on the event loop. A stage that raises yields None, like the old inline
+    try/except blocks. on_stage(name, ms, result), if given, is called as each
+    stage finishes (used for stage-by-stage job progress).
+    """
+
+    def __init__(self, executor=None, on_stage=None):
+        self.executor = executor  # None = the loop's default executor
+        self.on_stage = on_stage
+        self.timings = {}  # stage name -> milliseconds
+        self._stages = {}  # stage name -> (func, deps)
+
+    def add(self, name, func, deps=()):
+        # Dependencies must already be registered, which also rules out cycles
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = (func, tuple(deps))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        tasks = {}
+
+        async def run_stage(name, func, deps):
+            inputs = [await tasks[dep] for dep in deps]
+            start = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    result = await func(*inputs)
+                else:
+                    result = await loop.run_in_executor(self.executor, func, *inputs)
+            except Exception as e:
+                logger.error("Pipeline Stage '%s' Error: %s", name, e)
+                result = None
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 2)
+            if self.on_stage is not None:
+                try:
+                    self.on_stage(name, self.timings[name], result)
+                except Exception as e:
+                    logger.error("Pipeline Stage Callback Error (%s): %s", name, e)
+            return result
+
+        for name, (func, deps) in self._stages.items():
+            tasks[name] = asyncio.ensure_future(run_stage(name, func, deps))
+
+        results = await asyncio.gather(*tasks.values())
+        return dict(zip(tasks, results))
@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Workers are started from a clean forkserver process, not forked from the server:
+# forking a process that runs threads (log writer, stage pools) can copy a held lock
+POOL_START_METHOD = os.getenv(
+    "POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+class ProcessPool:
+    """
+    A ProcessPoolExecutor created on first use. After a worker dies
+    (BrokenProcessPool), reset() discards it and the next get() builds a new one,
+    instead of every later batch falling back to serial for the life of the process.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context(POOL_START_METHOD)
+                )
+            return self._executor
+
+    def reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,251 @@
+import asyncio
+import datetime
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from log_utils import get_logger
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of matching requests profiled without the header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")  # X-Profile must carry this value; unset = header ignored
+PROFILE_PATHS = tuple(p for p in os.getenv("PROFILE_PATHS", "/analyze,/generate_report").split(",") if p)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_ARTIFACTS = int(os.getenv("PROFILE_MAX_ARTIFACTS", "200"))  # Oldest profiles are deleted beyond this
+
+PROFILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Threads parked in these modules are idle (executor queues, the event loop's select), not work
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py")
+IDLE_FUNCTIONS = {("thread.py", "_worker")}  # ThreadPoolExecutor worker blocked on its work queue
+
+logger = get_logger("profiling")
+
+_active = threading.Lock()  # One profiled request at a time; others run unprofiled
+
+def token_matches(value):
+    """
+    True when PROFILE_TOKEN is configured and value (an X-Profile header,
+    str or bytes) equals it. Without a token nobody can profile on demand.
+    """
+    if not PROFILE_TOKEN or value is None:
+        return False
+    if isinstance(value, bytes):
+        value = value.decode("latin-1")
+    return hmac.compare_digest(value.encode(), PROFILE_TOKEN.encode())
+
+def wants_profile(path, raw_headers):
+    """
+    True when this request should be profiled: a matching path plus either an
+    X-Profile header carrying PROFILE_TOKEN or the PROFILE_SAMPLE_RATE draw.
+    raw_headers are the ASGI (name, value) byte pairs; they are only scanned
+    for matching paths.
+    """
+    if not path.startswith(PROFILE_PATHS):
+        return False
+    for name, value in raw_headers:
+        if name == b"x-profile" and token_matches(value):
+            return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a background thread snapshots every thread's Python
+    stack each interval via sys._current_frames(). That covers the event loop
+    and the executor threads a request fans out to (pandas, pypdf, fpdf).
+    Samples from other requests running at the same time are included too.
+    Stacks are kept in collapsed form ("outer;inner;leaf" -> count).
+    """
+
+    def __init__(self, interval_ms=PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._labels = {}  # code object -> "func (file:line)"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.time() - self.started_at
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    @staticmethod
+    def _idle(code):
+        filename = code.co_filename
+        return filename.endswith(IDLE_MODULES) or (os.path.basename(filename), code.co_name) in IDLE_FUNCTIONS
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or self._idle(frame.f_code):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        """
+        Brendan Gregg's collapsed-stack text (flamegraph.pl, speedscope).
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top=25):
+        """
+        Hottest functions by self samples (leaf of the stack) and by total
+        samples (anywhere on the stack, counted once per stack).
+        """
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+
+        def rows(counter):
+            return [
+                {"function": name, "samples": count, "percent": round(100 * count / self.samples, 1)}
+                for name, count in counter.most_common(top)
+            ]
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "duration_ms": round(self.duration * 1000, 2),
+            "self": rows(own) if self.samples else [],
+            "total": rows(total) if self.samples else [],
+        }
+
+class ProfileStore:
+    """
+    Profiles on local disk, by request id: <id>.json (request details and
+    summary) next to <id>.collapsed (full stacks). Only the newest max_artifacts
+    are kept.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, max_artifacts=PROFILE_MAX_ARTIFACTS):
+        self.directory = directory
+        self.max_artifacts = max_artifacts
+
+    def _path(self, profile_id, ext):
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            raise ValueError("Invalid profile id")
+        return os.path.join(self.directory, f"{profile_id}.{ext}")
+
+    def save(self, profile_id, details, profiler):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id, "collapsed"), "w") as fh:
+            fh.write(profiler.collapsed())
+        with open(self._path(profile_id, "json"), "w") as fh:
+            json.dump({"id": profile_id, **details, **profiler.summary()}, fh, indent=2)
+        self._prune()
+
+    def load(self, profile_id, collapsed=False):
+        """
+        The summary dict (or the collapsed stacks text), None if unknown.
+        """
+        try:
+            path = self._path(profile_id, "collapsed" if collapsed else "json")
+        except ValueError:
+            return None
+        if not os.path.exists(path):
+            return None
+        with open(path) as fh:
+            return fh.read() if collapsed else json.load(fh)
+
+    def _prune(self):
+        summaries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        if len(summaries) <= self.max_artifacts:
+            return
+        summaries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in summaries[:len(summaries) - self.max_artifacts]:
+            stem = entry.name[:-len(".json")]
+            for ext in ("json", "collapsed"):
+                try:
+                    os.remove(os.path.join(self.directory, f"{stem}.{ext}"))
+                except FileNotFoundError:
+                    pass
+
+profile_store = ProfileStore()
+
+def try_start_profile():
+    """
+    A started SamplingProfiler, or None when another request is already being profiled.
+    """
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        return SamplingProfiler().start()
+    except Exception:
+        _active.release()
+        raise
+
+def finish_profile(profiler):
+    profiler.stop()
+    _active.release()
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles selected requests (see wants_profile) from
+    the first byte in to the last byte out. The profile id is returned in the
+    X-Profile-ID header and the profile is saved to profile_store once the
+    response is complete. Other requests pass straight through.
+    """
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store or profile_store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not wants_profile(scope["path"], scope["headers"]):
+            return await self.app(scope, receive, send)
+        profiler = try_start_profile()
+        if profiler is None:
+            return await self.app(scope, receive, send)
+
+        profile_id = uuid.uuid4().hex
+        status = {}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            finish_profile(profiler)
+            details = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status.get("code"),
+                "created": datetime.datetime.utcfromtimestamp(profiler.started_at).isoformat(),
+            }
+            try:
+                await asyncio.to_thread(self.store.save, profile_id, details, profiler)
+            except Exception as e:
+                logger.warning("Profile Save Error (%s): %s", profile_id, e)
@@ -1,5 +1,35 @@
 from fpdf import FPDF
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
 import io
+import json
+import os
+import re
+import threading
+import zipfile
+
+from sqlalchemy import select, func
+
+from database import Company, FinancialReport
+from crypto_utils import decrypt_columns
+from tax import calculate_tax
+from money import cents
+from log_utils import get_logger
+from process_pools import ProcessPool
+
+REPORT_TEMPLATE_VERSION = "1"  # Bump when the layout changes, so cached PDFs are not reused
+REPORT_CACHE_MB = float(os.getenv("REPORT_CACHE_MB", "64"))  # Rendered PDFs kept in memory, by content hash
+REPORT_PARALLEL_MIN = int(os.getenv("REPORT_PARALLEL_MIN", "64"))  # Batches at least this big render in a process pool
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", str(os.cpu_count() or 1)))
+
+logger = get_logger("reports")
+
+# Common problem characters -> Latin-1 friendly equivalents, applied in one str.translate pass
+CLEAN_TABLE = str.maketrans({
+    '\u201c': '"', '\u201d': '"', '\u2018': "'", '\u2019': "'",
+    '\u2013': '-', '\u2014': '-', '\u2022': '*', '\u2026': '...'
+})
 
 class PDFReport(FPDF):
     def header(self):
@@ -24,15 +54,9 @@ def clean(text):
     """
     if not text:
         return ""
-    text = str(text)
     # Replace common problem characters
-    replacements = {
-        '\u201c': '"', '\u201d': '"', '\u2018': "'", '\u2019': "'",
-        '\u2013': '-', '\u2014': '-', '\u2022': '*', '\u2026': '...'
-    }
-    for k, v in replacements.items():
-        text = text.replace(k, v)
-        
+    text = str(text).translate(CLEAN_TABLE)
+
     # Final safety: encode to ascii, ignoring errors to prevent '?' clutter
     # Ideally we'd use a utf-8 font, but for MVP standard font:
     return text.encode('latin-1', 'ignore').decode('latin-1')
@@ -68,7 +92,7 @@ def generate_pdf_report(company_name, result):
             pdf.multi_cell(0, 7, clean(ai_summary))
             pdf.ln(5)
         except Exception as e:
-            print(f"Error in Exec Summary: {e}")
+            logger.error("Error in Exec Summary: %s", e)
             pdf.multi_cell(0, 10, "Summary generation failed.")
 
         # 2. Key Metrics
@@ -78,10 +102,12 @@ def generate_pdf_report(company_name, result):
             pdf.set_font("Arial", size=10)
             metrics = result.get('metrics', {})
             for k, v in metrics.items():
-                pdf.cell(100, 8, clean(f"{k}: ${v:,.2f}"), 0, 1)
+                # Money values get currency formatting; text metrics (margin, industry) print as-is
+                line = f"{k}: ${v:,.2f}" if isinstance(v, (int, float)) else f"{k}: {v}"
+                pdf.cell(100, 8, clean(line), 0, 1)
             pdf.ln(5)
         except Exception as e:
-            print(f"Error in Metrics: {e}")
+            logger.error("Error in Metrics: %s", e)
 
         # 3. Tax & Working Capital
         try:
@@ -93,16 +119,218 @@ def generate_pdf_report(company_name, result):
                 pdf.cell(100, 8, clean(f"Status: {result['tax'].get('message', 'N/A')}"), 0, 1)
                 pdf.ln(5)
         except Exception as e:
-             print(f"Error in Tax: {e}")
+             logger.error("Error in Tax: %s", e)
 
         # Output
         return pdf.output(dest='S').encode('latin-1', 'replace')
         
     except Exception as e:
-        print(f"CRITICAL PDF ERROR: {e}")
+        logger.error("CRITICAL PDF ERROR: %s", e)
         # Return a valid PDF saying error
         err_pdf = FPDF()
         err_pdf.add_page()
         err_pdf.set_font("Arial", size=12)
         err_pdf.cell(0, 10, "Error generating report. Please check server logs.", 0, 1)
         return err_pdf.output(dest='S').encode('latin-1', 'replace')
+
+def report_hash(company_name, result):
+    """
+    Content hash of everything a one-pager shows, plus the template version.
+    """
+    payload = json.dumps([REPORT_TEMPLATE_VERSION, company_name, result], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ReportCache:
+    """
+    Rendered PDFs by content hash, least recently used dropped first once
+    the total size passes max_bytes.
+    """
+
+    def __init__(self, max_bytes=int(REPORT_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._pdfs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._pdfs.get(key)
+            if pdf is None:
+                self.misses += 1
+                return None
+            self._pdfs.move_to_end(key)
+            self.hits += 1
+            return pdf
+
+    def put(self, key, pdf):
+        with self._lock:
+            if key in self._pdfs:
+                return
+            self._pdfs[key] = pdf
+            self.size += len(pdf)
+            while self.size > self.max_bytes and self._pdfs:
+                _, dropped = self._pdfs.popitem(last=False)
+                self.size -= len(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._pdfs.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {"reports": len(self._pdfs), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+report_cache = ReportCache()
+
+def render_report(company_name, result):
+    """
+    generate_pdf_report through the content-hash cache. Returns (hash, pdf bytes).
+    """
+    key = report_hash(company_name, result)
+    pdf = report_cache.get(key)
+    if pdf is None:
+        pdf = generate_pdf_report(company_name, result)
+        report_cache.put(key, pdf)
+    return key, pdf
+
+_pool = ProcessPool(REPORT_WORKERS)
+
+def _render_payload(payload):
+    return generate_pdf_report(payload[0], payload[1])
+
+def _render_many(todo):
+    """
+    PDF bytes for each payload in order: across the process pool for large
+    batches, in this process otherwise or for whatever is left if the pool breaks.
+    """
+    done = 0
+    if len(todo) >= REPORT_PARALLEL_MIN and REPORT_WORKERS > 1:
+        try:
+            rendered = _pool.get().map(_render_payload, todo, chunksize=max(1, len(todo) // (REPORT_WORKERS * 4)))
+            for pdf in rendered:
+                done += 1
+                yield pdf
+            return
+        except BrokenProcessPool as e:
+            _pool.reset()  # Rebuilt for the next batch
+            logger.warning("Report process pool broke after %d reports, rendering the rest in process: %s", done, e)
+        except Exception as e:
+            if done:
+                raise  # A report failed to render; rendering it again here would fail the same way
+            logger.warning("Report Pool Error, rendering in process: %s", e)
+    yield from map(_render_payload, todo[done:])
+
+def render_reports(payloads):
+    """
+    Renders many (company_name, result) one-pagers, yielding PDF bytes in input
+    order as they become available. Cached PDFs are reused; for large batches
+    the rest are rendered across a process pool.
+    """
+    keys = [report_hash(company_name, result) for company_name, result in payloads]
+    cached = [report_cache.get(key) for key in keys]
+    missing = [i for i, pdf in enumerate(cached) if pdf is None]
+
+    rendered = _render_many([payloads[i] for i in missing])
+
+    for key, pdf in zip(keys, cached):
+        if pdf is None:
+            pdf = next(rendered)
+            report_cache.put(key, pdf)
+        yield pdf
+
+class _ZipSink:
+    """
+    Write-only buffer for zipfile that hands back what was written since the last drain().
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(entries):
+    """
+    Streams (filename, bytes) entries as a ZIP archive, one chunk per entry,
+    without holding the whole archive in memory. PDFs are already compressed,
+    so entries are stored as-is.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+def report_filename(company_name, report_id=None):
+    safe = re.sub(r'[^A-Za-z0-9._-]+', '_', str(company_name)).strip('_') or "SME"
+    return f"Report_{safe}_{report_id}.pdf" if report_id is not None else f"Report_{safe}.pdf"
+
+def stored_report_payloads(db, report_ids=None, company_ids=None):
+    """
+    (report_id, company_name, result) for stored reports, in the order asked for,
+    with the figures decrypted in one batch. company_ids selects each company's
+    latest report. Unknown ids are skipped.
+    """
+    if company_ids is not None:
+        latest = (
+            select(func.max(FinancialReport.id))
+            .where(FinancialReport.company_id.in_(company_ids))
+            .group_by(FinancialReport.company_id)
+        )
+        condition = FinancialReport.id.in_(latest)
+    else:
+        condition = FinancialReport.id.in_(report_ids)
+
+    stmt = (
+        select(FinancialReport.id, FinancialReport.company_id, FinancialReport.revenue, FinancialReport.expenses,
+               FinancialReport.net_profit, FinancialReport.health_score, FinancialReport.ai_analysis_text,
+               Company.name, Company.industry)
+        .join(Company, Company.id == FinancialReport.company_id)
+        .where(condition)
+    )
+    rows = [dict(row._mapping) for row in db.execute(stmt)]
+    decrypt_columns(rows, ["revenue", "expenses", "net_profit"], float)
+
+    if company_ids is not None:
+        order = {company_id: i for i, company_id in enumerate(company_ids)}
+        rows.sort(key=lambda row: order[row["company_id"]])
+    else:
+        order = {report_id: i for i, report_id in enumerate(report_ids)}
+        rows.sort(key=lambda row: order[row["id"]])
+
+    payloads = []
+    for row in rows:
+        revenue, expenses, net_profit = row["revenue"] or 0.0, row["expenses"] or 0.0, row["net_profit"] or 0.0
+        profit_margin = (net_profit / revenue) * 100 if revenue > 0 else 0
+        metrics = {
+            "Total Revenue": revenue,
+            "Total Expenses": expenses,
+            "Net Profit": net_profit,
+            "Profit Margin": f"{profit_margin:.2f}%",
+            "Industry": row["industry"],
+        }
+        result = {
+            "health_score": row["health_score"],
+            "ai_analysis": row["ai_analysis_text"],
+            "metrics": metrics,
+        }
+        tax = calculate_tax({"revenue_cents": cents(revenue), "expense_cents": cents(expenses)}, None)
+        if tax:
+            result["tax"] = tax
+        payloads.append((row["id"], row["name"], result))
+    return payloads
@@ -1,15 +1,24 @@
-def calculate_tax(financial_summary, bookkeeping_data):
+from money import percent_of, units
+from log_utils import get_logger
+
+TAX_RATE_PERCENT = 25
+
+logger = get_logger("tax")
+
+def calculate_tax(totals, bookkeeping_data):
     """
     Estimates tax liability and identifies deductions.
     Assumptions:
     - Flat Corporate Tax Rate: 25% (indicative)
     - Deductible Categories: Operational, Marketing, Software, Travel, COGS, Payroll.
+    totals holds int cents ({"revenue_cents", "expense_cents"}), like the
+    bookkeeping breakdown; tax is rounded half up to the cent and returned in units.
     """
     try:
-        net_profit = financial_summary.get('Net Profit', 0)
+        net_profit = totals["revenue_cents"] - totals["expense_cents"]
         
         # 1. Estimate Tax Liability
-        estimated_tax = max(0, net_profit * 0.25)
+        estimated_tax = max(0, percent_of(net_profit, TAX_RATE_PERCENT))
         
         # 2. Identify Deductions
         deductible_cats = ["Operational", "Marketing", "Software", "Travel & Meals", "COGS", "Payroll"]
@@ -19,25 +28,25 @@ def calculate_tax(financial_summary, bookkeeping_data):
         if bookkeeping_data and 'breakdown' in bookkeeping_data:
             for item in bookkeeping_data['breakdown']:
                 if item['name'] in deductible_cats:
-                    total_deduction += item['value']
-                    deduction_breakdown.append(item)
+                    total_deduction += item['value_cents']
+                    deduction_breakdown.append({"name": item['name'], "value": units(item['value_cents'])})
         
         # 3. Tax Health Status
         status = "Good"
         msg = "Tax liability is manageable."
-        if estimated_tax > (net_profit * 0.4): # Just a heuristic
+        if estimated_tax * 10 > net_profit * 4: # Just a heuristic (over 40% of net profit)
             status = "High Tax Burden"
             msg = "Consider re-evaluating expenses or consulting a tax pro."
             
         return {
-            "estimated_tax": estimated_tax,
-            "tax_rate": "25% (Indicative)",
-            "total_deductible_expenses": total_deduction,
+            "estimated_tax": units(estimated_tax),
+            "tax_rate": f"{TAX_RATE_PERCENT}% (Indicative)",
+            "total_deductible_expenses": units(total_deduction),
             "deduction_breakdown": deduction_breakdown,
             "status": status,
             "message": msg
         }
 
     except Exception as e:
-        print(f"Tax Calc Error: {e}")
+        logger.error("Tax Calc Error: %s", e)
         return None
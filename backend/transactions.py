@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+from money import to_cents
+from pandas.api.types import CategoricalDtype
+from pandas.tseries.api import guess_datetime_format
+
+# Descriptions become categorical when at most this share of them is distinct (recurring payees)
+DESCRIPTION_CATEGORICAL_MAX_RATIO = float(os.getenv("DESCRIPTION_CATEGORICAL_MAX_RATIO", "0.5"))
+
+def date_format(dates):
+    """
+    The strftime format of the first parseable date string, or None. Chunked
+    readers pass it to every chunk so all chunks read dates the way
+    pd.to_datetime would over the whole column.
+    """
+    for value in dates.dropna():
+        if isinstance(value, str) and value.strip():
+            return guess_datetime_format(value.strip())
+    return None
+
+def categorical_descriptions(descriptions):
+    """
+    True when descriptions repeat enough for a categorical to be smaller than
+    one string per row.
+    """
+    sample = descriptions.head(50_000)
+    return len(sample) > 0 and sample.nunique() <= len(sample) * DESCRIPTION_CATEGORICAL_MAX_RATIO
+
+def compact_transactions(df, dates_format=None, categorical=None):
+    """
+    Canonical compact transaction frame, what every parser returns:
+    - date: datetime64 (unparseable values -> NaT)
+    - amount: float64 (unparseable -> 0), for display
+    - amount_cents: the same amounts as int64 cents, which every total is summed from
+    - description: categorical for repetitive ledgers, otherwise pandas' string
+      dtype (Arrow-backed when pyarrow is installed)
+    - category (if present): categorical
+    Other columns pass through. Columns already in the target dtype are not
+    touched, so compacting a compact frame is free.
+    """
+    columns = {}
+    if 'date' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['date']):
+        if dates_format is None:
+            dates_format = date_format(df['date'])
+        columns['date'] = pd.to_datetime(df['date'], format=dates_format, errors='coerce')
+    if 'amount' in df.columns and df['amount'].dtype != 'float64':
+        columns['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0).astype('float64')
+    if 'amount' in df.columns and 'amount_cents' not in df.columns:
+        columns['amount_cents'] = to_cents(columns.get('amount', df['amount']))
+    if 'description' in df.columns and not isinstance(df['description'].dtype, CategoricalDtype):
+        if categorical is None:
+            categorical = categorical_descriptions(df['description'])
+        columns['description'] = df['description'].astype('category' if categorical else 'str')
+    if 'category' in df.columns and not isinstance(df['category'].dtype, CategoricalDtype):
+        columns['category'] = df['category'].astype('category')
+    return df.assign(**columns) if columns else df
+
+def concat_transactions(frames):
+    """
+    pd.concat for compact frames. Categorical columns are first given one shared
+    set of categories, because concatenating differing categories falls back to
+    object strings.
+    """
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    for column in frames[0].columns:
+        parts = [frame[column] for frame in frames if column in frame.columns]
+        if len(parts) == len(frames) and all(isinstance(part.dtype, CategoricalDtype) for part in parts):
+            categories = parts[0].cat.categories
+            for part in parts[1:]:
+                categories = categories.union(part.cat.categories, sort=False)
+            shared = CategoricalDtype(categories)
+            frames = [frame.assign(**{column: frame[column].astype(shared)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
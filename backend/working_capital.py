@@ -1,15 +1,28 @@
-def analyze_working_capital(financial_summary, bookkeeping_data):
+from money import mean_cents, units
+from log_utils import get_logger
+
+logger = get_logger("working_capital")
+
+def analyze_working_capital(totals, bookkeeping_data, ledger=None):
     """
     Analyzes working capital health, burn rate, and cash runway.
+    Uses the shared monthly aggregate (ledger.monthly) for the average monthly burn when given.
+    totals ({"revenue_cents", "expense_cents"}), the breakdown and the monthly
+    buckets are int cents; amounts are converted to units only in the result.
     """
     try:
-        total_revenue = financial_summary.get('Total Revenue', 0)
-        total_expenses = financial_summary.get('Total Expenses', 0)
-        net_profit = financial_summary.get('Net Profit', 0)
+        total_revenue = totals["revenue_cents"]
+        total_expenses = totals["expense_cents"]
+        net_profit = total_revenue - total_expenses
         
         # 1. Burn Rate (Avg Monthly Expenses)
         # We assume the dataset spans roughly a month or we take the total expenses as the "burn" for this period
         burn_rate = total_expenses 
+        avg_monthly_burn = None
+        if ledger is not None and ledger.monthly is not None and not ledger.monthly.empty:
+            monthly_exp = ledger.active_months('expenses')
+            if not monthly_exp.empty:
+                avg_monthly_burn = units(mean_cents(monthly_exp['amount_cents'].to_numpy()))
         
         # 2. Runway (Hypothetical - usually requires Cash Balance)
         # Since we don't have Bank Balance in CSV, we assume a starting balance or just give general advice
@@ -22,9 +35,9 @@ def analyze_working_capital(financial_summary, bookkeeping_data):
         if bookkeeping_data and 'breakdown' in bookkeeping_data:
              for item in bookkeeping_data['breakdown']:
                  if item['name'] == 'Marketing':
-                     marketing_spend = item['value']
+                     marketing_spend = item['value_cents']
                  if item['name'] == 'Operational':
-                     operational_spend = item['value']
+                     operational_spend = item['value_cents']
         
         marketing_efficiency = (total_revenue / marketing_spend) if marketing_spend > 0 else 0
         
@@ -45,13 +58,14 @@ def analyze_working_capital(financial_summary, bookkeeping_data):
             recommendations.append("Marketing ROI is low. Review campaign targeting.")
 
         return {
-            "burn_rate": burn_rate,
+            "burn_rate": units(burn_rate),
+            "avg_monthly_burn": avg_monthly_burn,
             "marketing_efficiency": round(marketing_efficiency, 2),
             "status": status,
             "recommendations": recommendations,
-            "operational_spend": operational_spend
+            "operational_spend": units(operational_spend)
         }
 
     except Exception as e:
-        print(f"Working Capital Error: {e}")
+        logger.error("Working Capital Error: %s", e)
         return None
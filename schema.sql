@@ -3,7 +3,10 @@ CREATE TABLE IF NOT EXISTS companies (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL,
     industry VARCHAR(100),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    name_key VARCHAR(255) NOT NULL,      -- database.company_key: whitespace-collapsed, casefolded name
+    industry_key VARCHAR(100) NOT NULL,  -- whitespace-collapsed, casefolded industry
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_companies_name_industry UNIQUE (name_key, industry_key)
 );
 
 CREATE TABLE IF NOT EXISTS financial_reports (
@@ -17,3 +20,41 @@ CREATE TABLE IF NOT EXISTS financial_reports (
     ai_analysis_text TEXT,
     report_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+CREATE INDEX IF NOT EXISTS ix_financial_reports_company_date ON financial_reports (company_id, report_date);
+
+CREATE TABLE IF NOT EXISTS compliance_logs (
+    id SERIAL PRIMARY KEY,
+    company_name VARCHAR,
+    action_type VARCHAR,
+    ai_model VARCHAR,
+    decision_summary VARCHAR,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Keyset pagination of GET /compliance_logs sorts on (timestamp, id)
+CREATE INDEX IF NOT EXISTS ix_compliance_logs_timestamp ON compliance_logs (timestamp, id);
+CREATE INDEX IF NOT EXISTS ix_compliance_logs_company_timestamp ON compliance_logs (company_name, timestamp, id);
+CREATE INDEX IF NOT EXISTS ix_compliance_logs_action_timestamp ON compliance_logs (action_type, timestamp, id);
+
+-- Running aggregates for /analyze/append (see aggregates.py)
+CREATE TABLE IF NOT EXISTS company_aggregates (
+    company_id INTEGER PRIMARY KEY REFERENCES companies(id),
+    state TEXT,                          -- encrypted JSON
+    transactions INTEGER DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,  -- bumped by every append (compare-and-swap)
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Persistent tier of the LLM analysis cache (LLM_CACHE_PERSIST=true; see llm_cache.py)
+CREATE TABLE IF NOT EXISTS llm_cache (
+    cache_key VARCHAR(64) PRIMARY KEY,   -- content hash of summary, language, model, prompt version
+    response_text TEXT,
+    created_at TIMESTAMP
+);
+
+-- Existing databases (companies created before name_key/industry_key): run the migration in
+-- database.init_db, e.g. `python backend/database.py`. It backfills the keys with
+-- database.company_key (whitespace collapsed, str.casefold), merges duplicate companies with
+-- their reports and aggregates, and adds the constraints above. It is not repeated here in SQL
+-- because SQL lower() and Python casefold() disagree on non-ASCII names (Straße).